@@ -0,0 +1,343 @@
+import math
+
+import numpy as np
+
+from Environment import EnvironmentPool
+
+# The solver libraries are optional, only the one of the selected backend has to be installed
+try:
+    import gurobipy as gb
+except ImportError:
+    gb = None
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+# Variable types, shared by all backends
+CONTINUOUS = 'C'
+BINARY = 'B'
+INTEGER = 'I'
+
+
+# Parses the name of a variable (e.g. x[S1,D1,P1,1]) into its variable name and index
+def parse_name(name):
+    return name[0], tuple(name[2:-1].split(','))
+
+
+# Gurobi backend, the formulation is passed on to gurobipy directly
+class GurobiBackend:
+    quadratic = True
+
+    def __init__(self, environment=None):
+        if gb is None:
+            raise ImportError('The gurobi backend requires gurobipy to be installed')
+        self.mdl = gb.Model(env=EnvironmentPool.get(environment))
+        self.vtypes = {CONTINUOUS: gb.GRB.CONTINUOUS, BINARY: gb.GRB.BINARY, INTEGER: gb.GRB.INTEGER}
+        self.status = None
+
+    def add_vars(self, indices, vtype=CONTINUOUS, lb=0, ub=None, name=''):
+        return self.mdl.addVars(indices, vtype=self.vtypes[vtype], lb=lb, ub=gb.GRB.INFINITY if ub is None else ub,
+                                name=name)
+
+    @staticmethod
+    def set_bounds(var, lb=None, ub=None):
+        if lb is not None:
+            var.lb = lb
+        if ub is not None:
+            var.ub = ub
+
+    @staticmethod
+    def quicksum(terms):
+        return gb.quicksum(terms)
+
+    def add_constrs(self, constraints, name=''):
+        self.mdl.addConstrs(constraints, name=name)
+
+    def set_objective(self, expression):
+        self.mdl.setObjective(expression, gb.GRB.MINIMIZE)
+        self.mdl.update()
+
+    def solve(self, stopping_criteria=None):
+        if stopping_criteria is not None:
+            for key, value in stopping_criteria.items():
+                if key == 'objective':
+                    self.mdl.setParam('BestObjStop', value)
+                elif key == 'bound':
+                    self.mdl.setParam('BestBdStop', value)
+                elif key == 'gap':
+                    self.mdl.setParam('MIPGap', value)
+                elif key == 'time':
+                    self.mdl.setParam('TimeLimit', value)
+        self.mdl.optimize()
+        self.status = self.mdl.status
+        if self.mdl.status not in [2, 9, 11, 15] or self.mdl.getAttr('SolCount') == 0:
+            return np.inf
+        return self.mdl.getObjective().getValue()
+
+    def get_values(self):
+        variables = self.mdl.getVars()
+        return zip([var.VarName for var in variables], self.mdl.getAttr('X', variables))
+
+    def get_bound(self):
+        if self.mdl.IsMIP:
+            return self.mdl.ObjBound
+        return self.mdl.ObjVal
+
+    def set_start(self, variables, values):
+        self.mdl.setAttr('Start', variables, values)
+
+    def get_reduced_costs(self, var):
+        return self.mdl.getAttr('RC', var)
+
+    def write(self, filename):
+        self.mdl.write(filename)
+
+    # Runs the Gurobi tuning tool and writes the best parameters found to a parameter file
+    def tune(self, filename, time_limit=None):
+        if time_limit is not None:
+            self.mdl.setParam('TuneTimeLimit', time_limit)
+        self.mdl.tune()
+        if self.mdl.TuneResultCount == 0:
+            return False
+        self.mdl.getTuneResult(0)
+        self.mdl.write(filename)
+        return True
+
+
+# Linear expressions and constraints for backends without a modelling layer of their own. Only the operations that
+# are used in the formulation are supported, in particular there are no quadratic terms.
+class Expression:
+    # Makes numpy scalars (e.g. the tangent slopes) defer to the operators below
+    __array_ufunc__ = None
+    __hash__ = None
+
+    def __init__(self, coefficients=None, constant=0.0):
+        self.coefficients = {} if coefficients is None else coefficients
+        self.constant = constant
+
+    @staticmethod
+    def wrap(other):
+        return other if isinstance(other, Expression) else Expression(constant=float(other))
+
+    # Adds another term to this expression in place (only used while summing, so no variable is ever changed)
+    def add(self, other, scale=1.0):
+        other = Expression.wrap(other)
+        for index, coefficient in other.coefficients.items():
+            self.coefficients[index] = self.coefficients.get(index, 0.0) + scale * coefficient
+        self.constant += scale * other.constant
+        return self
+
+    def __add__(self, other):
+        return Expression(dict(self.coefficients), self.constant).add(other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Expression(dict(self.coefficients), self.constant).add(other, -1.0)
+
+    def __rsub__(self, other):
+        return Expression.wrap(other).__sub__(self)
+
+    def __neg__(self):
+        return self * -1.0
+
+    def __mul__(self, other):
+        other = float(other)
+        return Expression({index: other * coefficient for index, coefficient in self.coefficients.items()},
+                          other * self.constant)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return self * (1.0 / other)
+
+    def __le__(self, other):
+        return Constraint(self - other, -math.inf, 0.0)
+
+    def __ge__(self, other):
+        return Constraint(self - other, 0.0, math.inf)
+
+    def __eq__(self, other):
+        return Constraint(self - other, 0.0, 0.0)
+
+
+class Variable(Expression):
+    def __init__(self, index):
+        super().__init__({index: 1.0})
+        self.index = index
+
+
+class Constraint:
+    def __init__(self, expression, lower, upper):
+        self.coefficients = expression.coefficients
+        self.lower = lower - expression.constant
+        self.upper = upper - expression.constant
+
+
+# HiGHS backend, the formulation is collected column and row wise and passed on to highspy as a whole when solving
+class HighsBackend:
+    quadratic = False
+
+    def __init__(self, environment=None):
+        if highspy is None:
+            raise ImportError('The highs backend requires highspy to be installed')
+        self.highs = highspy.Highs()
+        for option, value in HighsBackend.options(EnvironmentPool.profile(environment)).items():
+            self.highs.setOptionValue(option, value)
+        self.lower, self.upper, self.types, self.names = [], [], [], []
+        self.rows = []
+        self.objective = Expression()
+        self.start = {}
+        self.built = False
+        self.status = None
+        self.bound_stop = None
+
+    # Translates the Gurobi parameters of an environment profile into HiGHS options
+    @staticmethod
+    def options(parameters):
+        options = {}
+        for parameter, value in parameters.items():
+            if parameter == 'OutputFlag':
+                options['output_flag'] = bool(value)
+            elif parameter == 'Threads':
+                options['threads'] = int(value)
+            elif parameter == 'Method':
+                options['solver'] = {0: 'simplex', 1: 'simplex', 2: 'ipm'}.get(value, 'choose')
+            elif parameter == 'Presolve':
+                options['presolve'] = {-1: 'choose', 0: 'off'}.get(value, 'on')
+        return options
+
+    def add_vars(self, indices, vtype=CONTINUOUS, lb=0, ub=None, name=''):
+        if vtype == BINARY:
+            ub = 1 if ub is None else min(ub, 1)
+        variables = {}
+        for index in indices:
+            variables[index] = Variable(len(self.names))
+            self.names.append(name + '[' + ','.join(str(i) for i in (index if isinstance(index, tuple) else (index,)))
+                              + ']')
+            self.lower.append(lb)
+            self.upper.append(math.inf if ub is None else ub)
+            self.types.append(vtype)
+        return variables
+
+    def set_bounds(self, var, lb=None, ub=None):
+        if lb is not None:
+            self.lower[var.index] = lb
+        if ub is not None:
+            self.upper[var.index] = ub
+
+    @staticmethod
+    def quicksum(terms):
+        expression = Expression()
+        for term in terms:
+            expression.add(term)
+        return expression
+
+    def add_constrs(self, constraints, name=''):
+        self.rows.extend(constraints)
+
+    def set_objective(self, expression):
+        self.objective = Expression.wrap(expression)
+
+    def build(self):
+        if self.built:
+            return
+        highs, n = self.highs, len(self.names)
+        highs.addVars(n, np.array(self.lower, dtype=np.double), np.array(self.upper, dtype=np.double))
+        columns = np.arange(n, dtype=np.int32)
+        costs = np.zeros(n, dtype=np.double)
+        for index, coefficient in self.objective.coefficients.items():
+            costs[index] = coefficient
+        highs.changeColsCost(n, columns, costs)
+        highs.changeObjectiveOffset(self.objective.constant)
+        if self.mip:
+            integrality = np.array([0 if vtype == CONTINUOUS else 1 for vtype in self.types], dtype=np.uint8)
+            highs.changeColsIntegrality(n, columns, integrality)
+        # Rows are passed in compressed sparse row format
+        starts, indices, values = [], [], []
+        for row in self.rows:
+            starts.append(len(indices))
+            indices.extend(row.coefficients.keys())
+            values.extend(row.coefficients.values())
+        highs.addRows(len(self.rows), np.array([row.lower for row in self.rows], dtype=np.double),
+                      np.array([row.upper for row in self.rows], dtype=np.double), len(indices),
+                      np.array(starts, dtype=np.int32), np.array(indices, dtype=np.int32),
+                      np.array(values, dtype=np.double))
+        self.built = True
+
+    @property
+    def mip(self):
+        return any(vtype != CONTINUOUS for vtype in self.types)
+
+    def solve(self, stopping_criteria=None):
+        self.build()
+        self.bound_stop = None
+        if stopping_criteria is not None:
+            for key, value in stopping_criteria.items():
+                if key == 'objective':
+                    self.highs.setOptionValue('objective_target', value)
+                elif key == 'bound':
+                    # The objective_bound option of HiGHS is a cutoff on the objective of the solutions, not a limit on
+                    # the best bound as BestBdStop, so the bound is compared with the best bound after the run
+                    self.bound_stop = value
+                elif key == 'gap':
+                    self.highs.setOptionValue('mip_rel_gap', value)
+                elif key == 'time':
+                    self.highs.setOptionValue('time_limit', float(value))
+        if self.start:
+            solution = highspy.HighsSolution()
+            solution.col_value = [self.start.get(index, self.lower[index]) for index in range(len(self.names))]
+            solution.value_valid = True
+            self.highs.setSolution(solution)
+        self.highs.run()
+        # Statuses are translated into the Gurobi status codes that the rest of the code relies on
+        status = self.highs.getModelStatus()
+        statuses = {
+            highspy.HighsModelStatus.kOptimal: 2,
+            highspy.HighsModelStatus.kInfeasible: 3,
+            highspy.HighsModelStatus.kUnbounded: 5,
+            highspy.HighsModelStatus.kTimeLimit: 9,
+            highspy.HighsModelStatus.kInterrupt: 11,
+            highspy.HighsModelStatus.kObjectiveBound: 15,
+            highspy.HighsModelStatus.kObjectiveTarget: 15
+        }
+        self.status = statuses.get(status, 1)
+        info = self.highs.getInfo()
+        # The objective of an LP is only a bound once it is solved to optimality
+        if self.bound_stop is not None and self.status in [2, 9, 11] and (self.mip or self.status == 2) and \
+                self.get_bound() >= self.bound_stop:
+            self.status = 15
+        if self.status not in [2, 9, 11, 15] or info.primal_solution_status != 2:
+            return np.inf
+        return info.objective_function_value
+
+    def get_values(self):
+        return zip(self.names, self.highs.getSolution().col_value)
+
+    def get_bound(self):
+        info = self.highs.getInfo()
+        bound = info.mip_dual_bound if self.mip else info.objective_function_value
+        if self.status == 15 and self.bound_stop is not None:
+            return max(self.bound_stop, bound)
+        return bound
+
+    def set_start(self, variables, values):
+        for var, value in zip(variables, values):
+            self.start[var.index] = value
+
+    def get_reduced_costs(self, var):
+        reduced_costs = self.highs.getSolution().col_dual
+        return {index: reduced_costs[variable.index] for index, variable in var.items()}
+
+    def write(self, filename):
+        self.build()
+        self.highs.writeModel(filename)
+
+    # HiGHS has no tuning tool, so no parameters are ever found
+    @staticmethod
+    def tune(filename, time_limit=None):
+        return False
+
+
+BACKENDS = {'gurobi': GurobiBackend, 'highs': HighsBackend}
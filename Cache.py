@@ -0,0 +1,85 @@
+import os
+import pickle
+import hashlib
+
+
+class Cache:
+    def __init__(self, directory='Cache', max_entries=10000, max_size=1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_size = max_size * 1024 ** 2  # Maximum size is given in MB
+        os.makedirs(directory, exist_ok=True)
+
+    # Canonical hash of everything that determines the outcome of a solve
+    @staticmethod
+    def key(problem, settings=None, bounds=None, parameters=None, stopping_criteria=None, solver='gurobi',
+            environment=None):
+        settings = {} if settings is None else settings
+        bounds = {} if bounds is None else bounds
+        parameters = {} if parameters is None else parameters
+        stopping_criteria = {} if stopping_criteria is None else stopping_criteria
+        content = [
+            solver,
+            problem.fingerprint,
+            sorted(problem.links),
+            sorted((setting, value) for setting, value in settings.items() if value),
+            sorted((var, sorted((index, sorted(bound.items())) for index, bound in var_bounds.items()))
+                   for var, var_bounds in bounds.items()),
+            sorted(parameters.items()),
+            # The bound criterion only stops a solve early, it is handled when an entry is retrieved
+            sorted((criterion, value) for criterion, value in stopping_criteria.items() if criterion != 'bound'),
+            # Solver parameters of the environment, except those that do not change what is solved
+            sorted((parameter, value) for parameter, value in ({} if environment is None else environment).items()
+                   if parameter not in ['Threads', 'OutputFlag'])
+        ]
+        if problem.random:
+            content.append(problem.scenarios)
+        return hashlib.sha256(repr(content).encode()).hexdigest()
+
+    # Returns a cached entry if it answers the given stopping criteria, None otherwise
+    def get(self, key, stopping_criteria=None):
+        filename = os.path.join(self.directory, key + '.pkl')
+        try:
+            with open(filename, 'rb') as file:
+                entry = pickle.load(file)
+        except (FileNotFoundError, EOFError):
+            # The entry does not exist or was evicted by another process while reading it
+            return None
+        # An entry of a solve that was stopped by its bound only proves that it cannot beat that bound
+        if entry['lower_bound'] is not None:
+            bound = stopping_criteria.get('bound') if stopping_criteria is not None else None
+            if bound is None or entry['lower_bound'] < bound:
+                return None
+        # Mark the entry as recently used
+        try:
+            os.utime(filename)
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def put(self, key, objective, solution, lower_bound=None):
+        filename = os.path.join(self.directory, key + '.pkl')
+        # Write to a temporary file first, so other processes never read a partially written entry
+        temporary_filename = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_filename, 'wb') as file:
+            pickle.dump({'objective': objective, 'solution': solution, 'lower_bound': lower_bound}, file)
+        os.replace(temporary_filename, filename)
+        self.evict()
+
+    # Remove least recently used entries until the cache satisfies its entry and size limits
+    def evict(self):
+        entries = [os.path.join(self.directory, filename) for filename in os.listdir(self.directory)
+                   if filename.endswith('.pkl')]
+        try:
+            entries = sorted(entries, key=os.path.getmtime)
+            total_size = sum(os.path.getsize(filename) for filename in entries)
+        except FileNotFoundError:
+            # Another process is evicting at the same time
+            return
+        while entries and (len(entries) > self.max_entries or total_size > self.max_size):
+            filename = entries.pop(0)
+            try:
+                total_size -= os.path.getsize(filename)
+                os.remove(filename)
+            except FileNotFoundError:
+                pass
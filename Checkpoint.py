@@ -0,0 +1,29 @@
+import os
+import pickle
+
+
+class Checkpoint:
+    def __init__(self, instance_name, directory='Checkpoints'):
+        self.directory = directory
+        self.filename = os.path.join(directory, instance_name + '.pkl')
+
+    def exists(self):
+        return os.path.isfile(self.filename)
+
+    # Persist the given heuristic state, writing to a temporary file first so a crash never corrupts the checkpoint
+    def save(self, state):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary_filename = self.filename + '.tmp'
+        with open(temporary_filename, 'wb') as file:
+            pickle.dump(state, file)
+        os.replace(temporary_filename, self.filename)
+
+    def load(self):
+        if not self.exists():
+            return None
+        with open(self.filename, 'rb') as file:
+            return pickle.load(file)
+
+    def clear(self):
+        if self.exists():
+            os.remove(self.filename)
@@ -0,0 +1,142 @@
+import numpy as np
+
+from Model import write_solution
+
+
+# Constructs an initial solution without a solver (alternative to the relaxed model of Step 1). Demands are served
+# one by one in order of their due period along the cheapest path from a supplier with production left, either direct
+# or through a depot at which the goods are passed on in the period in which they arrive (successive shortest paths
+# in the time-expanded network). The cost of a path is its capacity and distance costs per unit of volume (links count
+# as opened, as in Step 1), plus the backlog penalty per period by which the goods arrive early or late, up to
+# max_shift periods. Suppliers produce at least their minimum production in every period in which they produce, and
+# the volume passed on by a depot in a period does not exceed its capacity. Capacities follow from the resulting flows,
+# and in the random case every scenario is served separately. Demand that cannot be delivered is left in backlog, so
+# the final demand constraint may be violated (see repair_solution). The solution is loaded into the problem and
+# written to a solution file if an instance name is given, and its objective is returned.
+def construct_solution(problem, instance_name=None, max_shift=3):
+    start, end = problem.start, problem.end
+    N = len(problem.scenarios) if problem.random else 1
+    volume = np.array([problem.product_volume[p] for p in problem.P])
+    link_position = {link: position for position, link in enumerate(problem.links)}
+    S = [problem.node_index[s] for s in problem.S]
+    D = [problem.node_index[d] for d in problem.D]
+    C = [problem.node_index[c] for c in problem.C]
+
+    # Cost per unit of volume and duration of every path from a supplier to a customer, either direct (k = 0) or
+    # through depot k - 1, as S x C x K arrays
+    link_cost = np.full((len(problem.nodes), len(problem.nodes)), np.inf)
+    for i, j in problem.links:
+        link_cost[problem.node_index[i], problem.node_index[j]] = \
+            (problem.capacity_cost[i, j] + problem.distance[i, j]) / problem.truck_size
+    duration = problem.duration_matrix
+    depot_duration = duration[np.ix_(S, D)]
+    depot_capacity = np.array([problem.capacity[d] for d in problem.D], dtype=float)
+    depots = np.arange(len(D))[None, :, None]
+    path_cost = np.concatenate([link_cost[np.ix_(S, C)][:, :, None],
+                                (link_cost[np.ix_(S, D)][:, :, None] + link_cost[np.ix_(D, C)][None, :, :])
+                                .transpose(0, 2, 1)], axis=2)
+    path_duration = np.concatenate([duration[np.ix_(S, C)][:, :, None],
+                                    (duration[np.ix_(S, D)][:, :, None] + duration[np.ix_(D, C)][None, :, :])
+                                    .transpose(0, 2, 1)], axis=2)
+    shifts = np.arange(-max_shift, max_shift + 1)  # Positive shifts arrive early, negative shifts arrive late
+    suppliers = np.arange(len(S))[:, None, None]
+
+    x = np.zeros((len(problem.links), len(problem.P), end + 1, N))
+    arrivals = np.zeros((len(problem.C), len(problem.P), end + 1, N))
+    for theta in range(N):
+        # Production that is left per supplier, product and period
+        production = np.zeros((len(problem.S), len(problem.P), end + 1))
+        for s_position, s in enumerate(problem.S):
+            for p_position, p in enumerate(problem.P):
+                for t in problem.T:
+                    available = 1 if not problem.random else \
+                        problem.scenarios[theta]['availability'].get((s, p, t), 0)
+                    production[s_position, p_position, t] = problem.max_prod[s, p] * available
+        started = np.zeros(production.shape, dtype=bool)
+        # Volume that every depot can still pass on per period. Goods leave a depot in the period in which they
+        # arrive, so this keeps its inventory within its capacity at any moment of the period.
+        depot_left = np.repeat(depot_capacity[:, None], end + 1, axis=1)
+        # Goods that arrived ahead of the demand of a customer (because of a minimum production), per product
+        surplus = np.zeros((len(problem.C), len(problem.P)))
+        cum_demand = problem.cum_demand if not problem.random else problem.scenarios[theta]['cum_demand']
+        for t in problem.T:
+            for c_position, c in enumerate(problem.C):
+                for p_position, p in enumerate(problem.P):
+                    remaining = cum_demand[c, p, t] - (cum_demand[c, p, t - 1] if t > start else 0) \
+                        - surplus[c_position, p_position]
+                    surplus[c_position, p_position] = 0
+                    departure = t - path_duration[:, c_position, :, None] - shifts[None, None, :]
+                    feasible = np.isfinite(path_cost[:, c_position, :, None]) & (departure >= start) & \
+                        (departure + path_duration[:, c_position, :, None] <= end)
+                    cost = volume[p_position] * path_cost[:, c_position, :, None] + \
+                        problem.backlog_pen[c, p] * np.abs(shifts)[None, None, :]
+                    depot_arrival = np.clip(departure[:, 1:, :] + depot_duration[:, :, None], 0, end)
+                    while remaining > 1e-9:
+                        available = production[suppliers, p_position, np.clip(departure, 0, end)]
+                        available[:, 1:, :] = np.minimum(available[:, 1:, :],
+                                                         depot_left[depots, depot_arrival] / volume[p_position])
+                        total = np.where(feasible & (available > 1e-9), cost, np.inf)
+                        best = np.unravel_index(np.argmin(total), total.shape)
+                        if not np.isfinite(total[best]):
+                            # No supplier can deliver this demand anymore, it remains in backlog
+                            break
+                        s_position, path, _ = best
+                        tau = departure[best]
+                        amount = min(remaining, available[best])
+                        # A supplier that starts producing in a period produces at least its minimum production (in
+                        # the deterministic case), the rest is delivered ahead of the next demands of this customer
+                        if not problem.random and not started[s_position, p_position, tau]:
+                            amount = min(max(amount, problem.min_prod[problem.S[s_position], p]), available[best])
+                            started[s_position, p_position, tau] = True
+                        production[s_position, p_position, tau] -= amount
+                        remaining -= amount
+                        s = problem.S[s_position]
+                        if path == 0:
+                            x[link_position[s, c], p_position, tau, theta] += amount
+                        else:
+                            d = problem.D[path - 1]
+                            x[link_position[s, d], p_position, tau, theta] += amount
+                            x[link_position[d, c], p_position, tau + depot_duration[s_position, path - 1], theta] += \
+                                amount
+                            depot_left[path - 1, tau + depot_duration[s_position, path - 1]] -= \
+                                amount * volume[p_position]
+                        arrival = tau + path_duration[s_position, c_position, path]
+                        arrivals[c_position, p_position, arrival, theta] += amount
+                    surplus[c_position, p_position] = max(-remaining, 0)
+
+    # Trucks and capacities follow from the flows, inventories of customers from the arrivals. Goods are passed on at
+    # depots immediately, so depot inventories remain zero.
+    k = np.einsum('aptn,p->atn', x, volume) / problem.truck_size
+    v = k.max(axis=(1, 2))
+    inventory = np.cumsum(arrivals, axis=2)
+    suffix = (lambda theta: ()) if not problem.random else (lambda theta: (str(theta),))
+    solution = {'x': {}, 'k': {}, 'v': {}, 'l': {}, 'r': {}, 'I': {}}
+    for position, (i, j) in enumerate(problem.links):
+        solution['v'][i, j] = v[position]
+        solution['l'][i, j] = 1 if v[position] > 0 else 0
+        for t in problem.T:
+            for theta in range(N):
+                if k[position, t, theta] > 0:
+                    solution['k'][(i, j, str(t)) + suffix(theta)] = k[position, t, theta]
+                for p_position, p in enumerate(problem.P):
+                    if x[position, p_position, t, theta] > 0:
+                        solution['x'][(i, j, p, str(t)) + suffix(theta)] = x[position, p_position, t, theta]
+    for c_position, c in enumerate(problem.C):
+        for p_position, p in enumerate(problem.P):
+            for t in problem.T:
+                for theta in range(N):
+                    if inventory[c_position, p_position, t, theta] > 0:
+                        solution['I'][(c, p, str(t)) + suffix(theta)] = inventory[c_position, p_position, t, theta]
+    # Suppliers count as used in every period in which they produce
+    if not problem.random:
+        for s_position, s in enumerate(problem.S):
+            production = x[[link_position[link] for link in problem.links if link[0] == s], :, :, 0].sum(axis=0)
+            for p_position, p in enumerate(problem.P):
+                for t in problem.T:
+                    if production[p_position, t] > 0:
+                        solution['r'][s, p, str(t)] = 1
+    problem.load_solution(solution)
+    objective = problem.compute_objective()
+    if instance_name:
+        write_solution(instance_name, solution, objective)
+    return objective
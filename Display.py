@@ -1,24 +1,55 @@
+import os
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 
 
 class Display:
+    # Settings shared by all displays, these can be changed through Display.configure
+    settings = {'enabled': True, 'interactive': True, 'directory': None, 'file_format': 'png'}
+    # A single figure is reused by all displays, so drawing after every step does not leak figures
+    figure = None
+    axes = None
+    count = 0
+
+    # If enabled is False nothing is drawn (e.g. for benchmark runs). If interactive is False, figures are rendered
+    # without a window (suitable for headless nodes), in which case they should be written to a directory.
+    @classmethod
+    def configure(cls, enabled=True, interactive=True, directory=None, file_format='png'):
+        cls.settings = {'enabled': enabled, 'interactive': interactive, 'directory': directory,
+                        'file_format': file_format}
+        if not interactive:
+            plt.switch_backend('Agg')
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
     def __init__(self, problem):
         self.problem = problem
-        self.fig, self.ax = plt.subplots()
-        # Display settings
-        self.fig.canvas.set_window_title('Display')
-        plt.ion()
+        if Display.settings['enabled'] and (Display.figure is None or not plt.fignum_exists(Display.figure.number)):
+            Display.figure, Display.axes = plt.subplots()
+            # Display settings
+            if Display.settings['interactive']:
+                Display.figure.canvas.manager.set_window_title('Display')
+                plt.ion()
+        self.fig, self.ax = Display.figure, Display.axes
 
-    def draw(self, t, settings=None):
+    def draw(self, t, settings=None, name=None):
+        if not Display.settings['enabled']:
+            return
         self.ax.cla()
         self.ax.axis('equal')
         colors = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22"]
+        locations = self.problem.locations
+        # In the random case, the operational decisions of the first scenario are shown
+        scenario = ('0',) if self.problem.random else ()
+
+        # All annotated links are collected first and drawn at once as a single line collection
+        segments = []
 
         def annotate_link(link, text):
-            a, b = self.problem.locations.loc[link[0]], self.problem.locations.loc[link[1]]
+            a, b = locations.loc[link[0]], locations.loc[link[1]]
             x = [a['LocationX'], b['LocationX']]
             y = [a['LocationY'], b['LocationY']]
-            plt.plot(x, y, color=colors[0])
+            segments.append(list(zip(x, y)))
             self.ax.text(0.5 * sum(x), 0.5 * sum(y), text, color="black", fontsize=9, fontweight='bold')
 
         if settings:
@@ -31,29 +62,36 @@ class Display:
                                 text = str(round(v, 2)) if not settings['integer'] else str(int(v))
                                 annotate_link(link, text)
                     if settings['show_trucks']:
-                        link_time = link + (str(t),)
-                        k = self.problem.solution['k'][link_time]
+                        k = self.problem.solution['k'][link + (str(t),) + scenario]
                         if k > 0:
                             annotate_link(link, 'k=' + str(round(k, 2)))
                     if settings['show_transport']:
-                        link_product_time = link + ('P1', str(t),)
-                        transport = self.problem.solution['x'][link_product_time]
+                        transport = self.problem.solution['x'][link + ('P1', str(t),) + scenario]
                         if transport > 0:
                             annotate_link(link, 'x=' + str(round(transport, 2)))
 
                 if settings['show_inventory']:
                     for d in self.problem.D:
-                        location = self.problem.locations.loc[d]
+                        location = locations.loc[d]
                         x, y = location.LocationX, location.LocationY
-                        I = self.problem.inventory_depot(d, 'P1', t)
+                        I = sum(self.problem.solution['I'][(d, p, str(t)) + scenario] for p in self.problem.P)
                         self.ax.text(x + 0.25, y - 0.25, round(I, 2), color="black", fontsize=12)
+        self.ax.add_collection(LineCollection(segments, colors=colors[0]))
 
-        # Draw location markers
-        for i, location in self.problem.locations.iterrows():
-            x, y = location.LocationX, location.LocationY
-            color_indices = {'S': 1, 'D': 3, 'C': 2}
-            self.ax.plot(x, y, 'o', color=colors[color_indices[location['Location'][0]]])
-            self.ax.text(x, y, '$' + location['Location'] + '$', color="black", fontsize=11)
+        # Draw location markers, one call per location type
+        color_indices = {'S': 1, 'D': 3, 'C': 2}
+        for location_type, color_index in color_indices.items():
+            nodes = locations[locations['Location'].str[0] == location_type]
+            self.ax.plot(nodes['LocationX'], nodes['LocationY'], 'o', color=colors[color_index])
+        for location, x, y in zip(locations['Location'], locations['LocationX'], locations['LocationY']):
+            self.ax.text(x, y, '$' + location + '$', color="black", fontsize=11)
 
         # plt.grid()
-        plt.show()
+        if Display.settings['directory'] is not None:
+            if name is None:
+                name = self.problem.instance_name + '_' + str(Display.count)
+            Display.count += 1
+            self.fig.savefig(os.path.join(Display.settings['directory'], name + '.' + Display.settings['file_format']))
+        if Display.settings['interactive']:
+            plt.show()
+            plt.pause(0.001)
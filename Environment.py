@@ -0,0 +1,92 @@
+import os
+
+# Environments are only used by the gurobi backend, so gurobipy is optional here
+try:
+    import gurobipy as gb
+except ImportError:
+    gb = None
+
+# Named solver parameter profiles per model type, these can be selected per step in the heuristic settings. Other
+# names refer to (tuned) profiles that are saved as Profiles/<name>.prm.
+PARAMETER_PROFILES = {
+    'default': {},
+    # Pure LP models (e.g. LP relaxations). The candidate models of Step 2, Step 3 and the local search have fixed
+    # capacities and continuous trucks, but still contain binary opening and production variables, so they are MIPs.
+    'lp_barrier': {'Method': 2, 'Crossover': 0},
+    'lp_simplex': {'Method': 1},
+    # Integer models (Step 4 and the candidate models)
+    'mip_heuristic': {'MIPFocus': 1, 'Heuristics': 0.2},
+    'mip_bound': {'MIPFocus': 3}
+}
+
+
+# Returns the parameters of a named profile
+def get_profile(name=None):
+    if name is None:
+        return {}
+    if name in PARAMETER_PROFILES.keys():
+        return dict(PARAMETER_PROFILES[name])
+    filename = os.path.join('Profiles', name + '.prm')
+    if not os.path.isfile(filename):
+        raise ValueError('Unknown parameter profile: ' + name)
+    # Parameter files contain a parameter and its value on every line, lines starting with # are comments
+    profile = {}
+    with open(filename) as file:
+        for line in file:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            parameter, value = line.split()[:2]
+            try:
+                profile[parameter] = int(value)
+            except ValueError:
+                profile[parameter] = float(value)
+    return profile
+
+
+class EnvironmentPool:
+    # Started environments by parameter profile. Module state is not shared between processes, so each worker
+    # process builds its own environments (once) and reuses them for all its models.
+    environments = {}
+    pid = None
+    # Parameters that are applied to every environment, these can be changed through EnvironmentPool.configure
+    parameters = {}
+
+    @classmethod
+    def configure(cls, parameters=None):
+        parameters = {} if parameters is None else dict(parameters)
+        if parameters != cls.parameters:
+            cls.dispose()
+            cls.parameters = parameters
+
+    # Parameter profile consisting of the configured parameters, extended or overridden by the given ones
+    @classmethod
+    def profile(cls, parameters=None):
+        profile = dict(cls.parameters)
+        if parameters is not None:
+            profile.update(parameters)
+        return profile
+
+    # Returns the environment for the given parameter profile (e.g. Threads, Method, Presolve, OutputFlag)
+    @classmethod
+    def get(cls, parameters=None):
+        if cls.pid != os.getpid():
+            # Environments inherited from a parent process cannot be used, a new pool is started in this process
+            cls.environments = {}
+            cls.pid = os.getpid()
+        profile = cls.profile(parameters)
+        key = tuple(sorted(profile.items()))
+        if key not in cls.environments.keys():
+            env = gb.Env(empty=True)
+            for parameter, value in profile.items():
+                env.setParam(parameter, value)
+            env.start()
+            cls.environments[key] = env
+        return cls.environments[key]
+
+    @classmethod
+    def dispose(cls):
+        if cls.pid == os.getpid():
+            for env in cls.environments.values():
+                env.dispose()
+        cls.environments = {}
@@ -1,199 +1,301 @@
-import gurobipy as gb
+import os
+
 import numpy as np
 
+from Problem import ProductSet
+from Backend import BACKENDS, CONTINUOUS, BINARY, INTEGER, parse_name
+from Presolve import link_upper_bounds
+
 
 class Model:
-    def __init__(self, problem, settings=None, bounds=None, surpress_logs=False, parameters=None):
-        if settings is None:
-            settings = {}
-        for setting in ['all_links_open', 'non_integer_trucks', 'perfect_delivery', 'linear_backlog_approx']:
+    # Backend that the formulation is passed on to, this can be changed through Model.configure
+    solver = 'gurobi'
+
+    @classmethod
+    def configure(cls, solver='gurobi'):
+        if solver not in BACKENDS.keys():
+            raise ValueError('Unknown solver: ' + solver)
+        cls.solver = solver
+
+    def __init__(self, problem, settings=None, bounds=None, surpress_logs=False, parameters=None, environment=None,
+                 history=None):
+        settings = {} if settings is None else dict(settings)
+        for setting in ['all_links_open', 'non_integer_trucks', 'perfect_delivery', 'linear_backlog_approx',
+                        'lp_relaxation', 'compact_trucks']:
             if setting not in settings.keys():
                 settings[setting] = False
         if bounds is None:
             bounds = {}
         if parameters is None:
             parameters = {}
+        if history is None:
+            history = {}
 
         # Model setup
         # --------------------------------------------------------------------------------------
-        mdl = gb.Model()
+        # Solver parameters are given as a profile of the (pooled) environment the model is built on
+        environment = {} if environment is None else dict(environment)
         if surpress_logs:
-            mdl.setParam("OutputFlag", 0)
+            environment['OutputFlag'] = 0
+        backend = BACKENDS[Model.solver](environment)
+        quicksum = backend.quicksum
+        # Backends without quadratic objectives use the tangent line approximation of the backlog costs
+        if not backend.quadratic and not problem.random:
+            settings['linear_backlog_approx'] = True
 
-        # Index sets
+        # Index sets (materialized here, since the solver needs explicit lists of indices)
         if not problem.random:
-            link_product_time = problem.link_product_time
-            supplier_product_time = problem.supplier_product_time
-            link_time = problem.link_time
-            customer_product_time = problem.customer_product_time
-            dc_product_time = problem.dc_product_time
+            link_product_time = list(problem.link_product_time)
+            supplier_product_time = list(problem.supplier_product_time)
+            link_time = list(problem.link_time)
+            customer_product_time = list(problem.customer_product_time)
+            dc_product_time = list(problem.dc_product_time)
         else:
             N = len(problem.scenarios)
-            link_product_time = [(i, j, p, t, theta) for i, j, p, t in problem.link_product_time for theta in range(N)]
-            supplier_product_time = [(s, p, t, theta) for s, p, t in problem.supplier_product_time
-                                     for theta in range(N)]
-            link_time = [(i, j, t, theta) for i, j, t in problem.link_time for theta in range(N)]
-            customer_product_time = [(c, p, t, theta) for c, p, t in problem.customer_product_time
-                                     for theta in range(N)]
-            dc_product_time = [(i, p, t, theta) for i, p, t in problem.dc_product_time
-                               for theta in range(N)]
+            link_product_time = list(ProductSet(*problem.link_product_time.factors, range(N)))
+            supplier_product_time = list(ProductSet(*problem.supplier_product_time.factors, range(N)))
+            link_time = list(ProductSet(*problem.link_time.factors, range(N)))
+            customer_product_time = list(ProductSet(*problem.customer_product_time.factors, range(N)))
+            dc_product_time = list(ProductSet(*problem.dc_product_time.factors, range(N)))
 
         # Variables
         # --------------------------------------------------------------------------------------
-        x = mdl.addVars(link_product_time, vtype=gb.GRB.CONTINUOUS, lb=0, name='x')
+        # In the LP relaxation all binary and integer variables are replaced by continuous ones
+        binary = CONTINUOUS if settings['lp_relaxation'] else BINARY
+        x = backend.add_vars(link_product_time, vtype=CONTINUOUS, lb=0, name='x')
         if not problem.random:
-            r = mdl.addVars(supplier_product_time, vtype=gb.GRB.BINARY, name='r')
+            # Production decisions only exist for supplier/product pairs that have production data
+            r = backend.add_vars([(s, p, t) for s, p, t in supplier_product_time if (s, p) in problem.supplier_product],
+                                 vtype=binary, ub=1, name='r')
         if settings['all_links_open']:
-            l = mdl.addVars(problem.links, vtype=gb.GRB.BINARY, name='l', lb=1, ub=1)
+            l = backend.add_vars(problem.links, vtype=binary, name='l', lb=1, ub=1)
         else:
-            l = mdl.addVars(problem.links, vtype=gb.GRB.BINARY, name='l')
-        if settings['non_integer_trucks']:
-            k = mdl.addVars(link_time, vtype=gb.GRB.CONTINUOUS, lb=0, name='k')
-            v = mdl.addVars(problem.links, vtype=gb.GRB.CONTINUOUS, lb=0, name='v')
+            l = backend.add_vars(problem.links, vtype=binary, ub=1, name='l')
+        # Continuous trucks can be substituted out of the model (compact formulation, see below)
+        compact = settings['compact_trucks'] and (settings['non_integer_trucks'] or settings['lp_relaxation'])
+        if compact:
+            v = backend.add_vars(problem.links, vtype=CONTINUOUS, lb=0, name='v')
+        elif settings['non_integer_trucks'] or settings['lp_relaxation']:
+            k = backend.add_vars(link_time, vtype=CONTINUOUS, lb=0, name='k')
+            v = backend.add_vars(problem.links, vtype=CONTINUOUS, lb=0, name='v')
+        elif settings.get('integer_periods') is not None:
+            # Relax-and-fix: only the trucks of the periods first to last are integer, the others are continuous
+            first, last = settings['integer_periods']
+            k = backend.add_vars([index for index in link_time if first <= index[2] <= last], vtype=INTEGER, lb=0,
+                                 name='k')
+            k.update(backend.add_vars([index for index in link_time if not first <= index[2] <= last],
+                                      vtype=CONTINUOUS, lb=0, name='k'))
+            v = backend.add_vars(problem.links, vtype=INTEGER, lb=0, name='v')
         else:
-            k = mdl.addVars(link_time, vtype=gb.GRB.INTEGER, lb=0, name='k')
-            v = mdl.addVars(problem.links, vtype=gb.GRB.INTEGER, lb=0, name='v')
+            k = backend.add_vars(link_time, vtype=INTEGER, lb=0, name='k')
+            v = backend.add_vars(problem.links, vtype=INTEGER, lb=0, name='v')
         if settings['linear_backlog_approx'] or problem.random:
-            z = mdl.addVars(customer_product_time, vtype=gb.GRB.CONTINUOUS, lb=0, name='z')
+            z = backend.add_vars(customer_product_time, vtype=CONTINUOUS, lb=0, name='z')
 
-        I = mdl.addVars(dc_product_time, vtype=gb.GRB.CONTINUOUS, lb=0, name='I')
+        I = backend.add_vars(dc_product_time, vtype=CONTINUOUS, lb=0, name='I')
+
+        # If the model covers a time window that starts after the start of the horizon (rolling horizon), shipments
+        # that departed before the window are fixed at their values in the history. Only the periods from which a
+        # shipment can still arrive within the window are needed.
+        if problem.T[0] > problem.start:
+            history_time = list(range(max(problem.start, problem.T[0] - int(problem.duration_matrix.max())),
+                                      problem.T[0]))
+            if not problem.random:
+                history_product_time = ProductSet(problem.links, problem.P, history_time)
+            else:
+                history_product_time = ProductSet(problem.links, problem.P, history_time, range(N))
+            x_history = backend.add_vars(history_product_time, vtype=CONTINUOUS, lb=0, name='x')
+            for index, var in x_history.items():
+                value = history['x'][tuple(str(i) for i in index)]
+                backend.set_bounds(var, value, value)
+            x.update(x_history)
+
+        # In the compact formulation, continuous trucks are expressions of the transport volume instead of variables.
+        # Every optimal solution sends exactly the trucks required for its volume, so this removes a variable and the
+        # constraint that defines it for every link and period, without changing the objective.
+        if compact:
+            k = {index: quicksum(problem.product_volume[p] * x[index[:2] + (p,) + index[2:]] for p in problem.P) /
+                 problem.truck_size for index in link_time}
+
+        # Tightened upper bounds on the number of trucks (and thereby the capacity) of every link. A lower bound on
+        # the capacity that is provided below can only raise them.
+        upper_bounds = link_upper_bounds(problem, {link: bound['lb'] for link, bound in bounds.get('v', {}).items()
+                                                   if 'lb' in bound.keys()})
+        for (i, j) in problem.links:
+            backend.set_bounds(v[i, j], ub=upper_bounds[i, j])
+        if not compact:
+            for index, var in k.items():
+                backend.set_bounds(var, ub=upper_bounds[index[0], index[1]])
 
         # Set bounds if provided
-        if 'v' in bounds:
-            for (i, j) in bounds['v'].keys():
-                if 'lb' in bounds['v'][(i, j)].keys():
-                    v[i, j].lb = bounds['v'][(i, j)]['lb']
-                if 'ub' in bounds['v'][(i, j)].keys():
-                    v[i, j].ub = bounds['v'][(i, j)]['ub']
+        for var_name, var in [('v', v), ('l', l)]:
+            if var_name in bounds:
+                for (i, j) in bounds[var_name].keys():
+                    bound = bounds[var_name][(i, j)]
+                    backend.set_bounds(var[i, j], bound.get('lb'), bound.get('ub'))
+        if 'k' in bounds:
+            for index, bound in bounds['k'].items():
+                backend.set_bounds(k[index], bound.get('lb'), bound.get('ub'))
 
         # Objective
         # --------------------------------------------------------------------------------------
-        tot_opening_cost = gb.LinExpr()
-        tot_capacity_cost = gb.LinExpr()
-        tot_distance_cost = gb.LinExpr()
-        tot_holding_cost = gb.LinExpr()
-        tot_backlog_cost = gb.QuadExpr()
+        tot_opening_cost = quicksum([])
+        tot_capacity_cost = quicksum([])
+        tot_distance_cost = quicksum([])
+        tot_holding_cost = quicksum([])
+        tot_backlog_cost = quicksum([])
 
         # Opening costs
-        tot_opening_cost += gb.quicksum(problem.opening_cost[i, j] * l[i, j] for i, j in problem.links)
+        tot_opening_cost += quicksum(problem.opening_cost[i, j] * l[i, j] for i, j in problem.links)
 
         # Capacity costs
-        tot_capacity_cost += gb.quicksum(problem.capacity_cost[i, j] * v[i, j] for i, j in problem.links)
+        tot_capacity_cost += quicksum(problem.capacity_cost[i, j] * v[i, j] for i, j in problem.links)
 
         if not problem.random:
             # Distance costs
-            tot_distance_cost += gb.quicksum(problem.distance[i, j] * k[i, j, t] for i, j, t in problem.link_time)
+            tot_distance_cost += quicksum(problem.distance[i, j] * k[i, j, t] for i, j, t in problem.link_time)
 
             # Holding costs
-            tot_holding_cost += gb.quicksum(problem.holding_cost[d] * gb.quicksum(problem.product_volume[p] * I[d, p, t]
-                                                                                  for p in problem.P)
-                                            for d, t in problem.depot_time)
+            tot_holding_cost += quicksum(problem.holding_cost[d] * quicksum(problem.product_volume[p] * I[d, p, t]
+                                                                            for p in problem.P)
+                                         for d, t in problem.depot_time)
 
             # Backlog costs
             if not settings['perfect_delivery']:
                 if settings['linear_backlog_approx']:
-                    tot_backlog_cost += gb.quicksum(problem.backlog_pen[c, p] * z[c, p, t]
-                                                    for c, p, t in problem.customer_product_time)
+                    tot_backlog_cost += quicksum(problem.backlog_pen[c, p] * z[c, p, t]
+                                                 for c, p, t in problem.customer_product_time)
                 else:
-                    tot_backlog_cost += gb.quicksum(
+                    tot_backlog_cost += quicksum(
                         problem.backlog_pen[c, p] * (I[c, p, t] - problem.cum_demand[c, p, t]) ** 2
                         for c, p, t in problem.customer_product_time)
         else:
             # Distance costs
-            tot_distance_cost += (1 / N) * gb.quicksum(gb.quicksum(problem.distance[i, j] * k[i, j, t, theta]
-                                                                   for i, j, t in problem.link_time)
-                                                       for theta in range(N))
+            tot_distance_cost += (1 / N) * quicksum(quicksum(problem.distance[i, j] * k[i, j, t, theta]
+                                                             for i, j, t in problem.link_time)
+                                                    for theta in range(N))
             # Holding costs
-            tot_holding_cost += (1 / N) * gb.quicksum(
-                gb.quicksum(problem.holding_cost[d] *
-                            gb.quicksum(problem.product_volume[p] * I[d, p, t, theta] for p in problem.P)
-                            for d, t in problem.depot_time) for theta in range(N))
+            tot_holding_cost += (1 / N) * quicksum(
+                quicksum(problem.holding_cost[d] *
+                         quicksum(problem.product_volume[p] * I[d, p, t, theta] for p in problem.P)
+                         for d, t in problem.depot_time) for theta in range(N))
 
             # Backlog costs
-            tot_backlog_cost += (1 / N) * gb.quicksum(gb.quicksum(problem.backlog_pen[c, p] * z[c, p, t, theta]
-                                                                  for c, p, t in problem.customer_product_time) for
-                                                      theta in range(N))
+            tot_backlog_cost += (1 / N) * quicksum(quicksum(problem.backlog_pen[c, p] * z[c, p, t, theta]
+                                                            for c, p, t in problem.customer_product_time) for
+                                                   theta in range(N))
 
-        mdl.setObjective(tot_opening_cost + tot_capacity_cost + tot_distance_cost + tot_holding_cost + tot_backlog_cost,
-                         gb.GRB.MINIMIZE)
+        backend.set_objective(tot_opening_cost + tot_capacity_cost + tot_distance_cost + tot_holding_cost +
+                              tot_backlog_cost)
 
         # Constraints
         # --------------------------------------------------------------------------------------
         # Linking constraint for opening of links
-        mdl.addConstrs(
-            (10000 * l[i, j] >= v[i, j] for i, j in problem.links),
+        backend.add_constrs(
+            (upper_bounds[i, j] * l[i, j] >= v[i, j] for i, j in problem.links),
             name='Links must be opened to procure capacity'
         )
 
         if not problem.random:
             # Truck capacity on links
-            mdl.addConstrs(
+            backend.add_constrs(
                 (k[i, j, t] <= v[i, j] for i, j, t in link_time),
                 name='# Trucks cannot exceed capacity'
             )
             # Sufficient amount of trucks for transport size
-            mdl.addConstrs(
-                (k[i, j, t] >= gb.quicksum(problem.product_volume[p] * x[i, j, p, t]
-                                           for p in problem.P) / problem.truck_size
-                 for i, j, t in problem.link_time),
-                name='# Trucks required for transport volume'
-            )
+            if not compact:
+                backend.add_constrs(
+                    (k[i, j, t] >= quicksum(problem.product_volume[p] * x[i, j, p, t]
+                                            for p in problem.P) / problem.truck_size
+                     for i, j, t in problem.link_time),
+                    name='# Trucks required for transport volume'
+                )
             # Minimum production constraint for suppliers
-            mdl.addConstrs(
-                (gb.quicksum(x[s, j, p, t] for j in problem.D_and_C if (s, j) in problem.links) >=
-                 problem.min_prod[s, p] * r[s, p, t] for s, p, t in problem.supplier_product_time),
+            backend.add_constrs(
+                (quicksum(x[s, j, p, t] for j in problem.D_and_C if (s, j) in problem.links) >=
+                 problem.min_prod[s, p] * r[s, p, t] for s, p, t in problem.supplier_product_time
+                 if (s, p) in problem.supplier_product),
                 name='Minimum required production if supplier used'
             )
             # Maximum production constraint for suppliers
-            mdl.addConstrs(
-                (gb.quicksum(x[s, j, p, t] for j in problem.D_and_C if (s, j) in problem.links) <=
-                 problem.max_prod[s, p] * r[s, p, t] for s, p, t in problem.supplier_product_time),
+            backend.add_constrs(
+                (quicksum(x[s, j, p, t] for j in problem.D_and_C if (s, j) in problem.links) <=
+                 problem.max_prod[s, p] * r[s, p, t] for s, p, t in problem.supplier_product_time
+                 if (s, p) in problem.supplier_product),
+                name='Maximum allowed production if supplier used'
+            )
+            backend.add_constrs(
+                (quicksum(x[s, j, p, t] for j in problem.D_and_C if (s, j) in problem.links) <= 0
+                 for s, p, t in problem.supplier_product_time if (s, p) not in problem.supplier_product),
                 name='Maximum allowed production if supplier used'
             )
             # Capacity constraint for depots
-            mdl.addConstrs(
-                (gb.quicksum(problem.product_volume[p] * I[d, p, t] for p in problem.P) <= problem.capacity[d]
+            backend.add_constrs(
+                (quicksum(problem.product_volume[p] * I[d, p, t] for p in problem.P) <= problem.capacity[d]
                  for d, t in problem.depot_time),
                 name='Depot inventory volume cannot exceed capacity'
             )
-            # Cannot transport more from depots than is in their inventories
-            mdl.addConstrs(
-                (gb.quicksum(x[d, j, p, t] for j in problem.D_and_C if (d, j) in problem.links) <=
-                 I[d, p, t - 1] + gb.quicksum(x[j, d, p, t - problem.duration[j, d]] for j in problem.S_and_D
-                                              if
-                                              (j, d) in problem.links and t - problem.duration[j, d] >= problem.start)
-                 for d, p, t in problem.depot_product_time),
-                name='Outgoing transport from depot cannot exceed inventory'
-            )
+            # Cannot transport more from depots than is in their inventories (implied by the flow constraints and the
+            # nonnegative inventories, so left out of the compact formulation)
+            if not compact:
+                backend.add_constrs(
+                    (quicksum(x[d, j, p, t] for j in problem.D_and_C if (d, j) in problem.links) <=
+                     I[d, p, t - 1] + quicksum(x[j, d, p, t - problem.duration[j, d]] for j in problem.S_and_D
+                                               if
+                                               (j, d) in problem.links and t - problem.duration[j, d] >= problem.start)
+                     for d, p, t in problem.depot_product_time),
+                    name='Outgoing transport from depot cannot exceed inventory'
+                )
             # Flow constraints
-            mdl.addConstrs(
+            backend.add_constrs(
                 (I[d, p, t] == I[d, p, t - 1]
-                 + gb.quicksum(x[j, d, p, t - problem.duration[j, d]] for j in problem.S_and_D
-                               if (j, d) in problem.links and t - problem.duration[j, d] >= problem.start)
-                 - gb.quicksum(x[d, j, p, t] for j in problem.D_and_C if (d, j) in problem.links)
+                 + quicksum(x[j, d, p, t - problem.duration[j, d]] for j in problem.S_and_D
+                            if (j, d) in problem.links and t - problem.duration[j, d] >= problem.start)
+                 - quicksum(x[d, j, p, t] for j in problem.D_and_C if (d, j) in problem.links)
                  for d, p, t in problem.depot_product_time),
                 name='Depot inventory flow constraint'
             )
-            mdl.addConstrs(
+            backend.add_constrs(
                 (I[c, p, t] == I[c, p, t - 1]
-                 + gb.quicksum(x[i, c, p, t - problem.duration[i, c]] for i in problem.S_and_D
-                               if t - problem.duration[i, c] >= problem.start and (i, c) in problem.links)
+                 + quicksum(x[i, c, p, t - problem.duration[i, c]] for i in problem.S_and_D
+                            if t - problem.duration[i, c] >= problem.start and (i, c) in problem.links)
                  for c, p, t in problem.customer_product_time),
                 name='Customer inventory flow constraint'
             )
-            # Nodes start at zero inventory
-            mdl.addConstrs(
-                (I[i, p, 0] == 0 for i in problem.D_and_C for p in problem.P),
+            # Nodes start at zero inventory (or at the inventory of the history in a rolling horizon window)
+            backend.add_constrs(
+                (I[i, p, problem.T[0] - 1] == history.get('I', {}).get((i, p, str(problem.T[0] - 1)), 0)
+                 for i in problem.D_and_C for p in problem.P),
                 name='Nodes start at zero inventory'
             )
-            # All demand must be filled by end of period
-            mdl.addConstrs(
-                (I[c, p, problem.end] == problem.cum_demand[c, p, problem.end] for c, p in problem.customer_product),
-                name='Final customer inventory must match cumulative demand'
-            )
+            # All demand must be filled by end of period (only if the model covers the end of the horizon)
+            if problem.T[-1] == problem.end:
+                backend.add_constrs(
+                    (I[c, p, problem.end] == problem.cum_demand[c, p, problem.end]
+                     for c, p in problem.customer_product),
+                    name='Final customer inventory must match cumulative demand'
+                )
+            else:
+                # A rolling horizon window that ends earlier must keep the final demand reachable: what has arrived
+                # or is in transit at the end of the window, plus what the inbound links can still deliver in the
+                # remaining periods, must cover the cumulative demand at the end of the horizon (in volume)
+                last = problem.T[-1]
+                inbound = {c: [i for i in problem.S_and_D if (i, c) in problem.links] for c in problem.C}
+                in_transit = {(c, p): quicksum(x[i, c, p, t] for i in inbound[c]
+                                               for t in range(max(problem.start, last - problem.duration[i, c] + 1),
+                                                              last + 1))
+                              for c in problem.C for p in problem.P}
+                backend.add_constrs(
+                    (quicksum(problem.product_volume[p] * (I[c, p, last] + in_transit[c, p]) for p in problem.P)
+                     + problem.truck_size * quicksum(max(problem.end - last - problem.duration[i, c], 0) * v[i, c]
+                                                     for i in inbound[c])
+                     >= quicksum(problem.product_volume[p] * problem.cum_demand[c, p, problem.end] for p in problem.P)
+                     for c in problem.C),
+                    name='Final customer demand must remain reachable'
+                )
 
             if settings['perfect_delivery']:
-                mdl.addConstrs(
+                backend.add_constrs(
                     (I[c, p, t] == problem.cum_demand[c, p, t] for c, p, t in problem.customer_product_time),
                     name='Perfect delivery constraint'
                 )
@@ -202,119 +304,169 @@ class Model:
             if settings['linear_backlog_approx']:
                 boundary = parameters['boundary'] if 'boundary' in parameters.keys() else 5
                 delta = parameters['delta'] if 'delta' in parameters.keys() else 1
-                mdl.addConstrs(
+                backend.add_constrs(
                     (z[c, p, t] >= 2 * w * (I[c, p, t] - problem.cum_demand[c, p, t]) - w ** 2
                      for c, p, t in problem.customer_product_time
                      for w in np.arange(-boundary, boundary + delta, delta) if w != 0)
                 )
-                mdl.addConstrs(
+                backend.add_constrs(
                     (z[c, p, t] >= w * (I[c, p, t] - problem.cum_demand[c, p, t])
                      for c, p, t in problem.customer_product_time
                      for w in [-delta, delta])
                 )
         else:
             # Truck capacity on links
-            mdl.addConstrs(
+            backend.add_constrs(
                 (k[i, j, t, theta] <= v[i, j] for i, j, t, theta in link_time),
                 name='# Trucks cannot exceed capacity'
             )
             # Sufficient amount of trucks for transport size
-            mdl.addConstrs(
-                (k[i, j, t, theta] >= gb.quicksum(problem.product_volume[p] * x[i, j, p, t, theta]
-                                                  for p in problem.P) / problem.truck_size
-                 for i, j, t, theta in link_time),
-                name='# Trucks required for transport volume'
-            )
+            if not compact:
+                backend.add_constrs(
+                    (k[i, j, t, theta] >= quicksum(problem.product_volume[p] * x[i, j, p, t, theta]
+                                                   for p in problem.P) / problem.truck_size
+                     for i, j, t, theta in link_time),
+                    name='# Trucks required for transport volume'
+                )
             # Maximum production constraint for suppliers
-            mdl.addConstrs(
-                (gb.quicksum(x[s, j, p, t, theta] for j in problem.D_and_C if (s, j) in problem.links) <=
+            backend.add_constrs(
+                (quicksum(x[s, j, p, t, theta] for j in problem.D_and_C if (s, j) in problem.links) <=
                  problem.max_prod[s, p] * problem.scenarios[theta]['availability'][s, p, t]
                  for s, p, t, theta in supplier_product_time if (s, p) in problem.supplier_product),
                 name='Maximum allowed production if supplier used'
             )
-            mdl.addConstrs(
-                (gb.quicksum(x[s, j, p, t, theta] for j in problem.D_and_C if (s, j) in problem.links) <= 0
+            backend.add_constrs(
+                (quicksum(x[s, j, p, t, theta] for j in problem.D_and_C if (s, j) in problem.links) <= 0
                  for s, p, t, theta in supplier_product_time if (s, p) not in problem.supplier_product),
                 name='Maximum allowed production if supplier used'
             )
             # Capacity constraint for depots
-            mdl.addConstrs(
-                (gb.quicksum(problem.product_volume[p] * I[d, p, t, theta] for p in problem.P) <= problem.capacity[d]
+            backend.add_constrs(
+                (quicksum(problem.product_volume[p] * I[d, p, t, theta] for p in problem.P) <= problem.capacity[d]
                  for d, t in problem.depot_time for theta in range(N)),
                 name='Depot inventory volume cannot exceed capacity'
             )
-            # Cannot transport more from depots than is in their inventories
-            mdl.addConstrs(
-                (gb.quicksum(x[d, j, p, t, theta] for j in problem.D_and_C if (d, j) in problem.links) <=
-                 I[d, p, t - 1, theta] + gb.quicksum(x[j, d, p, t - problem.duration[j, d], theta]
-                                                     for j in problem.S_and_D if (j, d) in problem.links
-                                                     and t - problem.duration[j, d] >= problem.start)
-                 for d, p, t in problem.depot_product_time for theta in range(N)),
-                name='Outgoing transport from depot cannot exceed inventory'
-            )
+            # Cannot transport more from depots than is in their inventories (left out of the compact formulation)
+            if not compact:
+                backend.add_constrs(
+                    (quicksum(x[d, j, p, t, theta] for j in problem.D_and_C if (d, j) in problem.links) <=
+                     I[d, p, t - 1, theta] + quicksum(x[j, d, p, t - problem.duration[j, d], theta]
+                                                      for j in problem.S_and_D if (j, d) in problem.links
+                                                      and t - problem.duration[j, d] >= problem.start)
+                     for d, p, t in problem.depot_product_time for theta in range(N)),
+                    name='Outgoing transport from depot cannot exceed inventory'
+                )
             # Flow constraints
-            mdl.addConstrs(
+            backend.add_constrs(
                 (I[d, p, t, theta] == I[d, p, t - 1, theta]
-                 + gb.quicksum(x[j, d, p, t - problem.duration[j, d], theta] for j in problem.S_and_D
-                               if (j, d) in problem.links and t - problem.duration[j, d] >= problem.start)
-                 - gb.quicksum(x[d, j, p, t, theta] for j in problem.D_and_C if (d, j) in problem.links)
+                 + quicksum(x[j, d, p, t - problem.duration[j, d], theta] for j in problem.S_and_D
+                            if (j, d) in problem.links and t - problem.duration[j, d] >= problem.start)
+                 - quicksum(x[d, j, p, t, theta] for j in problem.D_and_C if (d, j) in problem.links)
                  for d, p, t in problem.depot_product_time for theta in range(N)),
                 name='Depot inventory flow constraint'
             )
-            mdl.addConstrs(
+            backend.add_constrs(
                 (I[c, p, t, theta] == I[c, p, t - 1, theta]
-                 + gb.quicksum(x[i, c, p, t - problem.duration[i, c], theta] for i in problem.S_and_D
-                               if t - problem.duration[i, c] >= problem.start and (i, c) in problem.links)
+                 + quicksum(x[i, c, p, t - problem.duration[i, c], theta] for i in problem.S_and_D
+                            if t - problem.duration[i, c] >= problem.start and (i, c) in problem.links)
                  for c, p, t in problem.customer_product_time for theta in range(N)),
                 name='Customer inventory flow constraint'
             )
-            # Nodes start at zero inventory
-            mdl.addConstrs(
-                (I[i, p, 0, theta] == 0 for i in problem.D_and_C for p in problem.P for theta in range(N)),
+            # Nodes start at zero inventory (or at the inventory of the history in a rolling horizon window)
+            backend.add_constrs(
+                (I[i, p, problem.T[0] - 1, theta] ==
+                 history.get('I', {}).get((i, p, str(problem.T[0] - 1), str(theta)), 0)
+                 for i in problem.D_and_C for p in problem.P for theta in range(N)),
                 name='Nodes start at zero inventory'
             )
 
             if settings['perfect_delivery']:
-                mdl.addConstrs(
+                backend.add_constrs(
                     (I[c, p, t, theta] == problem.scenarios[theta]['cum_demand'][c, p, problem.end]
                      for c, p, t in problem.customer_product_time for theta in range(N)),
                     name='Perfect delivery constraint'
                 )
 
-            mdl.addConstrs(
+            backend.add_constrs(
                 (z[c, p, t, theta] >= w * (I[c, p, t, theta] - problem.scenarios[theta]['cum_demand'][c, p, t])
                  for c, p, t in problem.customer_product_time
                  for w in [-1, 1] for theta in range(N))
             )
 
         # Generate model
-        mdl.update()
-        self.mdl = mdl
+        self.backend = backend
+        self.variables = {'x': x, 'l': l, 'v': v, 'I': I}
+        if not compact:
+            self.variables['k'] = k
+        self.compact = compact
+        self.product_volume = problem.product_volume
+        self.truck_size = problem.truck_size
 
     # Solve model and save solution to a solution file
     def solve(self, instance_name=None, stopping_criteria=None):
-        if stopping_criteria is not None:
-            for key, value in stopping_criteria.items():
-                if key == 'objective':
-                    self.mdl.setParam('BestObjStop', value)
-                elif key == 'bound':
-                    self.mdl.setParam('BestBdStop', value)
-                elif key == 'gap':
-                    self.mdl.setParam('MIPGap', value)
-                elif key == 'time':
-                    self.mdl.setParam('TimeLimit', value)
-        # Optimize
-        self.mdl.optimize()
-        if self.mdl.status not in [2, 9, 11, 15] or self.mdl.getAttr('SolCount') == 0:
+        objective = self.backend.solve(stopping_criteria)
+        self.status = self.backend.status
+        self.objective = objective
+        if objective == np.inf:
             return np.inf
         # Save solution
         if instance_name:
-            self.mdl.write('Solutions/' + instance_name + '.sol')
+            write_solution(instance_name, self.get_solution(), objective)
         # Return objective value
-        return self.mdl.getObjective().getValue()
+        return objective
+
+    # Returns the value of every variable in the same structure as a problem's solution
+    def get_solution(self):
+        solution = {}
+        for name, value in self.backend.get_values():
+            var_name, index = parse_name(name)
+            if var_name not in solution.keys():
+                solution[var_name] = {}
+            solution[var_name][index] = value
+        # Trucks of the compact formulation are derived from the transport volume
+        if self.compact:
+            solution['k'] = {}
+            for (i, j, p, *rest), value in solution['x'].items():
+                index = (i, j) + tuple(rest)
+                solution['k'][index] = solution['k'].get(index, 0) + self.product_volume[p] * value / self.truck_size
+        return solution
+
+    # Use the values of a (previous) solution as starting point for the next solve
+    def set_start(self, solution):
+        variables, values = [], []
+        for var_name, var in self.variables.items():
+            if var_name in solution.keys():
+                for index, variable in var.items():
+                    key = tuple(str(i) for i in index) if isinstance(index, tuple) else (str(index),)
+                    if key in solution[var_name].keys():
+                        variables.append(variable)
+                        values.append(solution[var_name][key])
+        self.backend.set_start(variables, values)
+
+    # Returns the reduced cost of every index of a variable after solving a continuous model
+    def get_reduced_costs(self, var_name):
+        return self.backend.get_reduced_costs(self.variables[var_name])
+
+    # Returns the best proven lower bound on the objective after solving
+    def get_bound(self):
+        return self.backend.get_bound()
 
     def write(self, instance_name):
-        self.mdl.write('Instances/' + instance_name + '.lp')
+        self.backend.write('Instances/' + instance_name + '.lp')
+
+    # Tune the solver parameters on this model and save the best ones as a parameter profile
+    def tune(self, profile_name, time_limit=None):
+        os.makedirs('Profiles', exist_ok=True)
+        return self.backend.tune(os.path.join('Profiles', profile_name + '.prm'), time_limit)
 
     def save_solution(self, instance_name):
-        self.mdl.write('Solutions/' + instance_name + '.sol')
+        write_solution(instance_name, self.get_solution(), self.objective)
+
+
+# Write a solution to a solution file in the same format as Gurobi uses
+def write_solution(instance_name, solution, objective):
+    with open('Solutions/' + instance_name + '.sol', 'w') as file:
+        file.write('# Objective value = ' + str(objective) + '\n')
+        for var, values in solution.items():
+            for index, value in values.items():
+                file.write(var + '[' + ','.join(index) + '] ' + str(value) + '\n')
@@ -0,0 +1,139 @@
+import heapq
+import math
+
+
+# Removes links and supplier/product pairs from a problem that cannot be part of any (or are not needed in some)
+# optimal solution, before any model is built. Returns a report of everything that was removed.
+def presolve(problem, verbose=True):
+    report = {
+        'Supplier/product pairs without production': remove_empty_supplier_products(problem),
+        'Links that cannot deliver within the horizon': remove_unusable_links(problem),
+        'Links dominated by a path through a depot': remove_dominated_links(problem)
+    }
+    if verbose:
+        print()
+        print('Presolve |')
+        print('-' * 70)
+        for reason, removed in report.items():
+            print(reason, '|', len(removed))
+            for item in removed:
+                print('   ', item)
+        print('-' * 70)
+    return report
+
+
+# Supplier/product pairs with a maximum production of zero can never produce anything
+def remove_empty_supplier_products(problem):
+    removed = [(s, p) for s, p in problem.supplier_product if problem.max_prod[s, p] <= 0]
+    problem.supplier_product = [pair for pair in problem.supplier_product if pair not in removed]
+    return removed
+
+
+# Shortest durations from a set of sources to every node over the given links (Dijkstra)
+def shortest_durations(problem, sources, links, reverse=False):
+    durations = {node: math.inf for node in problem.nodes}
+    queue = [(0, node) for node in sources]
+    for node in sources:
+        durations[node] = 0
+    neighbours = {node: [] for node in problem.nodes}
+    for i, j in links:
+        if reverse:
+            neighbours[j].append((i, problem.duration[i, j]))
+        else:
+            neighbours[i].append((j, problem.duration[i, j]))
+    while queue:
+        duration, node = heapq.heappop(queue)
+        if duration > durations[node]:
+            continue
+        for neighbour, link_duration in neighbours[node]:
+            if duration + link_duration < durations[neighbour]:
+                durations[neighbour] = duration + link_duration
+                heapq.heappush(queue, (duration + link_duration, neighbour))
+    return durations
+
+
+# A link can only be useful if goods can reach its origin from a producing supplier, and can then still reach a
+# customer before the end of the horizon through it. Goods on any other link never arrive at a customer in time, so
+# using the link only adds costs.
+def remove_unusable_links(problem):
+    suppliers = list(set(s for s, p in problem.supplier_product))
+    horizon = problem.end - problem.start
+    removed = []
+    # Removing links can make other links unusable, so this is repeated until nothing changes
+    while True:
+        from_suppliers = shortest_durations(problem, suppliers, problem.links)
+        to_customers = shortest_durations(problem, problem.C, problem.links, reverse=True)
+        unusable = [(i, j) for i, j in problem.links
+                    if from_suppliers[i] + problem.duration[i, j] + to_customers[j] > horizon]
+        if not unusable:
+            return removed
+        for link in unusable:
+            problem.links.remove(link)
+        removed += unusable
+
+
+# A link (i, j) is dominated by a path i -> d -> j through a depot d if the path arrives at the same time and the
+# opening costs, capacity costs and distances of its two links are together at most those of link (i, j). Goods can
+# pass through a depot in the period in which they arrive, so rerouting all goods of (i, j) over the path does not
+# change any inventory, and never needs more trucks or capacity on each of its links than (i, j) used. Links that
+# make up the path of a removed link are never removed themselves, so every removed link keeps its dominating path.
+def remove_dominated_links(problem):
+    links = set(problem.links)
+    protected = set()
+    removed = []
+    for i, j in list(problem.links):
+        if (i, j) in protected:
+            continue
+        for d in problem.D:
+            if d in [i, j] or (i, d) not in links or (d, j) not in links:
+                continue
+            path = [(i, d), (d, j)]
+            if (sum(problem.duration[link] for link in path) == problem.duration[i, j]
+                    and sum(problem.opening_cost[link] for link in path) <= problem.opening_cost[i, j]
+                    and sum(problem.capacity_cost[link] for link in path) <= problem.capacity_cost[i, j]
+                    and sum(problem.distance[link] for link in path) <= problem.distance[i, j]):
+                problem.links.remove((i, j))
+                links.remove((i, j))
+                protected.update(path)
+                removed.append((i, j))
+                break
+    return removed
+
+
+# Upper bounds on the number of trucks per period on every link. The volume that is shipped over a link in a period
+# is bounded by the total production over the horizon, by the production of its origin if that is a supplier, by the
+# capacity of its origin plus the arrivals at its origin if that is a depot, and (in the deterministic case) by the
+# total demand of its destination if that is a customer. No optimal solution needs more trucks, or more capacity,
+# than these bounds, which therefore also replace the big-M of the link opening constraints. Capacities that are
+# imposed (e.g. as lower bounds) can only raise them.
+def link_upper_bounds(problem, capacities=None):
+    supply = {s: sum(problem.product_volume[p] * problem.max_prod[s, p] for p in problem.P) for s in problem.S}
+    total_supply = sum(supply.values()) * (problem.end - problem.start + 1)
+    volume = {}
+    for i, j in problem.links:
+        volume[i, j] = total_supply
+        if i in problem.S:
+            volume[i, j] = min(volume[i, j], supply[i])
+        if j in problem.C and not problem.random:
+            volume[i, j] = min(volume[i, j], sum(problem.product_volume[p] * problem.cum_demand[j, p, problem.end]
+                                                 for p in problem.P))
+    # Bounds on the arrivals at depots are propagated to the links leaving them, until no bound decreases anymore
+    incoming = {d: [link for link in problem.links if link[1] == d] for d in problem.D}
+    outgoing = {d: [link for link in problem.links if link[0] == d] for d in problem.D}
+    for _ in range(len(problem.D) + 1):
+        changed = False
+        for d in problem.D:
+            outflow = problem.capacity[d] + sum(volume[link] for link in incoming[d])
+            for link in outgoing[d]:
+                if outflow < volume[link]:
+                    volume[link] = outflow
+                    changed = True
+        if not changed:
+            break
+    # Rounding prevents a bound that is an exact multiple of the truck size from being rounded up
+    upper_bounds = {link: math.ceil(round(volume[link] / problem.truck_size, 6)) for link in problem.links}
+    if capacities is not None:
+        for link, capacity in capacities.items():
+            if link in upper_bounds:
+                upper_bounds[link] = max(upper_bounds[link], math.ceil(capacity))
+    return upper_bounds
@@ -1,131 +1,304 @@
 import csv
 import os
+import copy
+import math
+import json
+import hashlib
+import itertools
+from collections.abc import Mapping
 import pandas as pd
 import numpy as np
 
 from Display import Display
+from Presolve import link_upper_bounds
 
 
-# Function that can create random instances
-def gen_instance(seed, num_s, num_d, num_c, num_p, T):
+# Names of the sheets (or tables) that make up an instance
+SHEETS = ['Suppliers', 'Depots', 'Customers', 'Products', 'Links', 'Demand', 'Backlog Penalty', 'Production',
+          'Parameters']
+
+
+# Function that can create random instances. All sheets are generated at once from NumPy arrays, so instances with
+# thousands of nodes and hundreds of time periods can be generated in seconds.
+def gen_instance(seed, num_s, num_d, num_c, num_p, T, file_format='xlsx', verbose=False):
     np.random.seed(seed)
     n = num_s + num_d + num_c
     s_coordinates = (1 / 10) * np.random.randint(0, 10 * n, (num_s, 2))
     d_coordinates = (1 / 10) * np.random.randint(2.5 * n, 7.5 * n, (num_d, 2))
     c_coordinates = (1 / 10) * np.random.randint(0, 10 * n, (num_c, 2))
+    suppliers = np.array(['S' + str(i + 1) for i in range(num_s)])
+    depots = np.array(['D' + str(i + 1) for i in range(num_d)])
+    customers = np.array(['C' + str(i + 1) for i in range(num_c)])
+    products = np.array(['P' + str(i + 1) for i in range(num_p)])
+    periods = np.array(['T' + str(t) for t in range(5, T + 1)])
     # Sheet 1 - Suppliers
-    supplier_data = pd.DataFrame(index=['S' + str(i + 1) for i in range(num_s)],
+    supplier_data = pd.DataFrame(s_coordinates, index=pd.Index(suppliers, name='SupplierID'),
                                  columns=['LocationX', 'LocationY'])
-    supplier_data.index.name = 'SupplierID'
-    for i in range(num_s):
-        supplier_data.loc['S' + str(i + 1), :] = [s_coordinates[i][0], s_coordinates[i][1]]
-    print(supplier_data)
     # Sheet 2 - Depots
-    depot_data = pd.DataFrame(index=['D' + str(i + 1) for i in range(num_d)],
-                              columns=['LocationX', 'LocationY', 'Capacity', 'Holding Cost'])
-    depot_data.index.name = 'DepotID'
-    for i in range(num_d):
-        capacity = round(7 + 20 * np.random.random(), 2)
-        holding_cost = round(0.3 + 0.3 * np.random.random(), 2)
-        depot_data.loc['D' + str(i + 1), :] = [d_coordinates[i][0], d_coordinates[i][1],
-                                               capacity, holding_cost]
-    print(depot_data)
+    depot_data = pd.DataFrame({'LocationX': d_coordinates[:, 0],
+                               'LocationY': d_coordinates[:, 1],
+                               'Capacity': np.round(7 + 20 * np.random.random(num_d), 2),
+                               'Holding Cost': np.round(0.3 + 0.3 * np.random.random(num_d), 2)},
+                              index=pd.Index(depots, name='DepotID'))
     # Sheet 3 - Customers
-    customer_data = pd.DataFrame(index=['C' + str(i + 1) for i in range(num_c)],
+    customer_data = pd.DataFrame(c_coordinates, index=pd.Index(customers, name='CustomerID'),
                                  columns=['LocationX', 'LocationY'])
-    customer_data.index.name = 'CustomerID'
-    for i in range(num_c):
-        customer_data.loc['C' + str(i + 1), :] = [c_coordinates[i][0], c_coordinates[i][1]]
-    print(customer_data)
     # Sheet 4 - Products
-    product_data = pd.DataFrame(index=['P' + str(i + 1) for i in range(num_p)],
-                                columns=['Size'])
-    product_data.index.name = 'ProductID'
-    for i in range(num_p):
-        product_data.loc['P' + str(i + 1), :] = round(0.2 + 0.8 * np.random.random(), 2)
-    print(product_data)
-    # Sheet 5 - Links
-    origins = ['S' + str(i + 1) for i in range(num_s)] + ['D' + str(i + 1) for i in range(num_d)]
-    destinations = ['D' + str(i + 1) for i in range(num_d)] + ['C' + str(i + 1) for i in range(num_c)]
-    links = [(i, j) for i in origins for j in destinations if i != j]
-    link_data = pd.DataFrame(index=pd.MultiIndex.from_tuples(links),
-                             columns=['Opening Cost', 'Capacity Cost', 'Duration'])
-    link_data.index.names = ['Origin', 'Destination']
-
-    # Determine all distances
-    locations = pd.concat([supplier_data.iloc[:, :3].rename(columns={'SupplierID': 'Location'}),
-                           depot_data.iloc[:, :3].rename(columns={'DepotID': 'Location'}),
-                           customer_data.iloc[:, :3].rename(columns={'CustomerID': 'Location'})])
-    distance = {a: np.hypot(locations.loc[a[0]]['LocationX'] - locations.loc[a[1]]['LocationX'],
-                            locations.loc[a[0]]['LocationY'] - locations.loc[a[1]]['LocationY']) for a in links}
-    bins = [np.quantile(list(distance.values()), q) for q in [0.25, 0.5, 0.75]]
-    durations = np.digitize(list(distance.values()), bins)
-    link_index = 0
-    for i in origins:
-        for j in destinations:
-            if i != j:
-                opening_cost = round(50 + 100 * np.random.random(), 2)
-                capacity_cost = round(5 + 10 * np.random.random(), 2)
-                link_data.loc[i, j] = [opening_cost, capacity_cost, durations[link_index] + 1]
-                link_index += 1
-    print(link_data)
+    product_data = pd.DataFrame({'Size': np.round(0.2 + 0.8 * np.random.random(num_p), 2)},
+                                index=pd.Index(products, name='ProductID'))
+    # Sheet 5 - Links (all origin-destination pairs, except from a depot to itself)
+    origins = np.concatenate([suppliers, depots])
+    destinations = np.concatenate([depots, customers])
+    origin_index, destination_index = np.nonzero(origins[:, None] != destinations[None, :])
+    # Determine all distances and derive the durations from their quartiles
+    distance = distance_matrix(np.concatenate([s_coordinates, d_coordinates]),
+                               np.concatenate([d_coordinates, c_coordinates]))[origin_index, destination_index]
+    bins = np.quantile(distance, [0.25, 0.5, 0.75])
+    num_links = len(origin_index)
+    link_data = pd.DataFrame({'Opening Cost': np.round(50 + 100 * np.random.random(num_links), 2),
+                              'Capacity Cost': np.round(5 + 10 * np.random.random(num_links), 2),
+                              'Duration': np.digitize(distance, bins) + 1},
+                             index=pd.MultiIndex.from_arrays([origins[origin_index], destinations[destination_index]],
+                                                             names=['Origin', 'Destination']))
     # Sheet 6 - Demand
-    demand_data = pd.DataFrame(index=pd.MultiIndex.from_product([['C' + str(i + 1) for i in range(num_c)],
-                                                                 ['P' + str(j + 1) for j in range(num_p)],
-                                                                 ['T' + str(t) for t in range(5, T + 1)]], ),
-                               columns=['Amount'])
-    demand_data.index.names = ['Customer', 'Product', 'Time']
-    for i in range(1, num_c + 1):
-        for j in range(1, num_p + 1):
-            for t in range(5, T + 1):
-                if np.random.random() > 0.7:
-                    demand_data.loc['C' + str(i), 'P' + str(j), 'T' + str(t)] = round(18 * np.random.random(), 2)
-                else:
-                    demand_data.loc['C' + str(i), 'P' + str(j), 'T' + str(t)] = 0
-    print(demand_data)
+    demand_index = pd.MultiIndex.from_product([customers, products, periods], names=['Customer', 'Product', 'Time'])
+    demand_amount = np.round(18 * np.random.random(len(demand_index)), 2)
+    demand_data = pd.DataFrame({'Amount': np.where(np.random.random(len(demand_index)) > 0.7, demand_amount, 0)},
+                               index=demand_index)
     # Sheet 7 - Backlogs
-    backlog_data = pd.DataFrame(index=pd.MultiIndex.from_product([['C' + str(i + 1) for i in range(num_c)],
-                                                                  ['P' + str(j + 1) for j in range(num_p)]]),
-                                columns=['Amount'])
-    backlog_data.index.names = ['Customer', 'Product']
-    for i in range(num_c):
-        for j in range(num_p):
-            backlog_data.loc['C' + str(i + 1), 'P' + str(j + 1)] = round(7 + 10 * np.random.random(), 2)
-    print(backlog_data)
+    backlog_data = pd.DataFrame({'Amount': np.round(7 + 10 * np.random.random(num_c * num_p), 2)},
+                                index=pd.MultiIndex.from_product([customers, products], names=['Customer', 'Product']))
     # Sheet 8 - Production
-    production_data = pd.DataFrame(index=pd.MultiIndex.from_product([['S' + str(i + 1) for i in range(num_s)],
-                                                                     ['P' + str(j + 1) for j in range(num_p)]]),
-                                   columns=['Minimum', 'Maximum'])
-    production_data.index.names = ['Supplier', 'Product']
-    for i in range(num_s):
-        for j in range(num_p):
-            if np.random.random() <= 0.8:
-                min_production = round(7 + 10 * np.random.random(), 2)
-                max_production = round(min_production + 5 + 5 * np.random.random(), 2)
-            else:
-                min_production = 0
-                max_production = 0
-            production_data.loc['S' + str(i + 1), 'P' + str(j + 1)] = [min_production, max_production]
-    print(production_data)
+    produces = np.random.random(num_s * num_p) <= 0.8
+    min_production = np.round(7 + 10 * np.random.random(num_s * num_p), 2)
+    max_production = np.round(min_production + 5 + 5 * np.random.random(num_s * num_p), 2)
+    production_data = pd.DataFrame({'Minimum': np.where(produces, min_production, 0),
+                                    'Maximum': np.where(produces, max_production, 0)},
+                                   index=pd.MultiIndex.from_product([suppliers, products],
+                                                                    names=['Supplier', 'Product']))
     # Sheet 9 - Parameters
-    parameter_data = pd.DataFrame(index=['Truck Size', 'Start Time Horizon', 'End Time Horizon'],
-                                  columns=['Value'])
-    parameter_data.index.name = 'Parameter'
-    parameter_data.loc['Truck Size', :] = round(1 + 2 * np.random.random(), 2)
-    parameter_data.loc['Start Time Horizon', :] = 'T1'
-    parameter_data.loc['End Time Horizon', :] = 'T' + str(T)
-    print(parameter_data)
-
-    with pd.ExcelWriter('Instances/' + str(seed) + '.xlsx') as writer:
-        supplier_data.to_excel(writer, sheet_name='Suppliers', merge_cells=False)
-        depot_data.to_excel(writer, sheet_name='Depots', merge_cells=False)
-        customer_data.to_excel(writer, sheet_name='Customers', merge_cells=False)
-        product_data.to_excel(writer, sheet_name='Products', merge_cells=False)
-        link_data.to_excel(writer, sheet_name='Links', merge_cells=False)
-        demand_data.to_excel(writer, sheet_name='Demand', merge_cells=False)
-        backlog_data.to_excel(writer, sheet_name='Backlog Penalty', merge_cells=False)
-        production_data.to_excel(writer, sheet_name='Production', merge_cells=False)
-        parameter_data.to_excel(writer, sheet_name='Parameters', merge_cells=False)
+    parameter_data = pd.DataFrame({'Value': [round(1 + 2 * np.random.random(), 2), 'T1', 'T' + str(T)]},
+                                  index=pd.Index(['Truck Size', 'Start Time Horizon', 'End Time Horizon'],
+                                                 name='Parameter'))
+
+    sheets = dict(zip(SHEETS, [supplier_data, depot_data, customer_data, product_data, link_data, demand_data,
+                               backlog_data, production_data, parameter_data]))
+    if verbose:
+        for sheet_name, sheet in sheets.items():
+            print(sheet_name, '|')
+            print(sheet)
+    write_instance(str(seed), sheets, file_format)
+
+
+# Write the sheets of an instance to an .xlsx file, or to a directory with one table per sheet in a columnar format
+def write_instance(instance_name, sheets, file_format='xlsx'):
+    if file_format == 'xlsx':
+        with pd.ExcelWriter('Instances/' + instance_name + '.xlsx') as writer:
+            for sheet_name, sheet in sheets.items():
+                sheet.to_excel(writer, sheet_name=sheet_name, merge_cells=False,
+                               index=not isinstance(sheet.index, pd.RangeIndex))
+        return
+    directory = os.path.join('Instances', instance_name)
+    os.makedirs(directory, exist_ok=True)
+    for sheet_name, sheet in sheets.items():
+        if not isinstance(sheet.index, pd.RangeIndex):
+            sheet = sheet.reset_index()
+        # Columnar formats require a single type per column (the Parameters sheet mixes numbers and text)
+        for column in sheet.columns[sheet.dtypes == object]:
+            sheet[column] = sheet[column].astype(str)
+        filename = os.path.join(directory, sheet_name + '.' + file_format)
+        if file_format == 'parquet':
+            sheet.to_parquet(filename, index=False)
+        elif file_format == 'feather':
+            sheet.to_feather(filename)
+        elif file_format == 'csv':
+            sheet.to_csv(filename, index=False)
+        else:
+            raise ValueError('Unknown instance file format: ' + file_format)
+
+
+# Read the sheets of an instance, either from the directory Instances/<name> that holds one Parquet, Feather/Arrow or
+# CSV table per sheet, or from Instances/<name>.xlsx. Returns the sheets and the files they were read from.
+def read_instance(instance_name):
+    directory = os.path.join(os.getcwd(), 'Instances', instance_name)
+    if not os.path.isdir(directory):
+        filename = os.path.join(os.getcwd(), 'Instances', instance_name + '.xlsx')
+        return pd.read_excel(filename, sheet_name=None, engine='openpyxl'), [filename]
+    readers = {
+        '.parquet': pd.read_parquet,
+        '.feather': pd.read_feather,
+        '.arrow': pd.read_feather,
+        '.csv': pd.read_csv
+    }
+    data, filenames = {}, []
+    for sheet_name in SHEETS:
+        for extension, reader in readers.items():
+            filename = os.path.join(directory, sheet_name + extension)
+            if os.path.isfile(filename):
+                data[sheet_name] = reader(filename)
+                filenames.append(filename)
+                break
+        else:
+            raise FileNotFoundError('No table found for sheet ' + sheet_name + ' of instance ' + instance_name)
+    return data, filenames
+
+
+# Convert an existing instance (e.g. an .xlsx file) to a directory of tables in the given format
+def convert_instance(instance_name, file_format='parquet', new_instance_name=None):
+    data, _ = read_instance(instance_name)
+    if new_instance_name is None:
+        new_instance_name = instance_name
+    write_instance(new_instance_name, data, file_format)
+
+
+# Write an objective breakdown to files; one CSV file per table, or a single JSON file with all tables
+def write_report(breakdown, filename, file_format='csv'):
+    tables = ['links', 'depots', 'customers', 'scenarios']
+    if file_format == 'csv':
+        for table in tables:
+            breakdown[table].to_csv(filename + '_' + table + '.csv')
+        pd.Series(breakdown['totals']).to_csv(filename + '_totals.csv', header=['Value'])
+    elif file_format == 'json':
+        with open(filename + '.json', 'w') as file:
+            file.write('{"totals": ' + json.dumps({key: float(value) for key, value in breakdown['totals'].items()}))
+            # Each table is written separately, so the full report never has to be built as one string
+            for table in tables:
+                file.write(', "' + table + '": ')
+                breakdown[table].reset_index().to_json(file, orient='records')
+            file.write('}')
+    else:
+        raise ValueError('Unknown report file format: ' + file_format)
+
+
+# Euclidean distances between all origin and all destination coordinates, computed with a single broadcast
+def distance_matrix(origin_coordinates, destination_coordinates):
+    return np.hypot(origin_coordinates[:, None, 0] - destination_coordinates[None, :, 0],
+                    origin_coordinates[:, None, 1] - destination_coordinates[None, :, 1])
+
+
+# Dictionary view on a node x node matrix, with the links of a problem as its keys
+class LinkMatrixView(Mapping):
+    def __init__(self, matrix, node_index, links):
+        self.matrix = matrix
+        self.node_index = node_index
+        self.links = links
+        self.members = None
+
+    def __getitem__(self, link):
+        return self.matrix[self.node_index[link[0]], self.node_index[link[1]]].item()
+
+    # The matrix has a value for every pair of nodes, but only the (current) links are keys of the view
+    def __contains__(self, link):
+        version = getattr(self.links, 'version', None)
+        if self.members is None or self.members[0] != version:
+            self.members = (version, frozenset(self.links))
+        return link in self.members[1]
+
+    def get(self, link, default=None):
+        return self[link] if link in self else default
+
+    def __iter__(self):
+        return iter(self.links)
+
+    def __len__(self):
+        return len(self.links)
+
+
+# List of the elements of an index set that can change (the links of a problem). Its version is raised by every change,
+# so that the members of the index sets built on it can be cached.
+class IndexList(list):
+    version = 0
+
+    def changed(self):
+        self.version += 1
+
+    def append(self, element):
+        super().append(element)
+        self.changed()
+
+    def extend(self, elements):
+        super().extend(elements)
+        self.changed()
+
+    def insert(self, position, element):
+        super().insert(position, element)
+        self.changed()
+
+    def remove(self, element):
+        super().remove(element)
+        self.changed()
+
+    def pop(self, position=-1):
+        element = super().pop(position)
+        self.changed()
+        return element
+
+    def clear(self):
+        super().clear()
+        self.changed()
+
+    def __setitem__(self, position, element):
+        super().__setitem__(position, element)
+        self.changed()
+
+    def __delitem__(self, position):
+        super().__delitem__(position)
+        self.changed()
+
+    def __iadd__(self, elements):
+        self.extend(elements)
+        return self
+
+
+# Lazy cartesian product of index sets. It behaves like the list of (flattened) tuples it represents, but nothing is
+# materialized until it is iterated over. Because the factors are referenced rather than copied, removing a link from
+# the links of a problem immediately removes it from every index set that is built on those links.
+class ProductSet:
+    def __init__(self, *factors):
+        self.factors = factors
+        # Members of every factor as a set, built when first needed. Factors other than index lists never change.
+        self.members = [None] * len(factors)
+
+    def factor_members(self, position):
+        factor = self.factors[position]
+        version = getattr(factor, 'version', None)
+        if self.members[position] is None or self.members[position][0] != version:
+            self.members[position] = (version, frozenset(factor))
+        return self.members[position][1]
+
+    def __len__(self):
+        length = 1
+        for factor in self.factors:
+            length *= len(factor)
+        return length
+
+    def __iter__(self):
+        # Factors of scalars are wrapped in 1-tuples, so each combination is flattened by concatenating tuples
+        factors = [factor if len(factor) > 0 and isinstance(factor[0], tuple) else [(element,) for element in factor]
+                   for factor in self.factors]
+        for combination in itertools.product(*factors):
+            yield sum(combination, ())
+
+    def __contains__(self, item):
+        if not isinstance(item, tuple):
+            return False
+        position = 0
+        for factor_position, factor in enumerate(self.factors):
+            if len(factor) == 0:
+                return False
+            if isinstance(factor[0], tuple):
+                width = len(factor[0])
+                part = item[position:position + width]
+            else:
+                width = 1
+                part = item[position] if position < len(item) else None
+            if part not in self.factor_members(factor_position):
+                return False
+            position += width
+        return position == len(item)
+
+    def __repr__(self):
+        return 'ProductSet' + repr(self.factors)
 
 
 class Problem:
@@ -136,9 +309,13 @@ class Problem:
         self.random = random
         if seed:
             np.random.seed(seed)
-        cwd = os.getcwd()
-        filename = os.path.join(cwd, 'Instances/' + instance_name + '.xlsx')
-        data = pd.read_excel(filename, sheet_name=None, engine='openpyxl')
+        data, filenames = read_instance(instance_name)
+        # Fingerprint that identifies this exact instance, used to cache solutions across runs
+        fingerprint = hashlib.sha256()
+        for filename in filenames:
+            with open(filename, 'rb') as file:
+                fingerprint.update(file.read())
+        self.fingerprint = fingerprint.hexdigest() + '_T' + str(extra_time_periods)
 
         # Data extraction
         # --------------------------------------------------------------------------------------
@@ -151,7 +328,7 @@ class Problem:
         backlog_data = data['Backlog Penalty']
         production_data = data['Production']
         parameter_data = data['Parameters']
-        self.truck_size = data['Parameters']['Value'][0]
+        self.truck_size = float(data['Parameters']['Value'][0])
 
         # Object- and index sets
         # --------------------------------------------------------------------------------------
@@ -167,121 +344,162 @@ class Problem:
         if extra_time_periods:
             self.end = round(self.end * 1.1)
         self.T = [t for t in range(self.start, self.end + 1, 1)]
-        self.links = [(link_data['Origin'][i], link_data['Destination'][i]) for i in range(len(link_data))]
+        self.links = IndexList(zip(link_data['Origin'], link_data['Destination']))
         # Index sets
-        self.customer_product = [(backlog_data['Customer'][i], backlog_data['Product'][i]) for i in
-                                 range(len(backlog_data))]
-        self.supplier_product = [(production_data['Supplier'][i], production_data['Product'][i])
-                                 for i in range(len(production_data))]
-        self.demand_set = [(demand_data['Customer'][i], demand_data['Product'][i],
-                            int(demand_data['Time'][i].replace('T', ''))) for i in range(len(demand_data))]
-
-        self.link_product_time = []
-        for a in self.links:
-            for p in self.P:
-                for t in self.T:
-                    self.link_product_time.append((a[0], a[1], p, t))
-
-        self.link_time = []
-        for a in self.links:
-            for t in self.T:
-                self.link_time.append((a[0], a[1], t))
-
-        self.supplier_product_time = []
-        for s in self.S:
-            for p in self.P:
-                for t in self.T:
-                    self.supplier_product_time.append((s, p, t))
-
-        self.depot_time = []
-        for d in self.D:
-            for t in self.T:
-                self.depot_time.append((d, t))
-
-        self.depot_product_time = []
-        for d in self.D:
-            for p in self.P:
-                for t in self.T:
-                    self.depot_product_time.append((d, p, t))
+        self.customer_product = list(zip(backlog_data['Customer'], backlog_data['Product']))
+        self.supplier_product = list(zip(production_data['Supplier'], production_data['Product']))
+        self.demand_set = list(zip(demand_data['Customer'], demand_data['Product'],
+                                   demand_data['Time'].str.replace('T', '').astype(int)))
 
-        self.customer_product_time = []
-        for c in self.C:
-            for p in self.P:
-                for t in self.T:
-                    self.customer_product_time.append((c, p, t))
-
-        self.dc_product_time = []
-        for i in self.D_and_C:
-            for p in self.P:
-                for t in [0] + self.T:
-                    self.dc_product_time.append((i, p, t))
+        self.build_index_sets()
 
         # Parameter/data sets
         # --------------------------------------------------------------------------------------
-        self.holding_cost = {self.D[i]: depot_data['Holding Cost'][i] for i in range(len(self.D))}
-        self.capacity = {self.D[i]: depot_data['Capacity'][i] for i in range(len(self.D))}
-        self.product_volume = {self.P[i]: product_data['Size'][i] for i in range(len(self.P))}
-        self.opening_cost = {self.links[i]: link_data['Opening Cost'][i] for i in range(len(link_data))}
-        self.capacity_cost = {self.links[i]: link_data['Capacity Cost'][i] for i in range(len(link_data))}
-        self.duration = {self.links[i]: link_data['Duration'][i] for i in range(len(link_data))}
+        self.holding_cost = dict(zip(self.D, depot_data['Holding Cost']))
+        self.capacity = dict(zip(self.D, depot_data['Capacity']))
+        self.product_volume = dict(zip(self.P, product_data['Size']))
+        self.opening_cost = dict(zip(self.links, link_data['Opening Cost']))
+        self.capacity_cost = dict(zip(self.links, link_data['Capacity Cost']))
         self.locations = pd.concat([supplier_data.iloc[:, :3].rename(columns={'SupplierID': 'Location'}),
                                     depot_data.iloc[:, :3].rename(columns={'DepotID': 'Location'}),
                                     customer_data.iloc[:, :3].rename(columns={'CustomerID': 'Location'})])
         self.locations.set_index([self.locations['Location']], inplace=True)
-        self.distance = {a: np.hypot(self.locations.loc[a[0]]['LocationX'] - self.locations.loc[a[1]]['LocationX'],
-                                     self.locations.loc[a[0]]['LocationY'] - self.locations.loc[a[1]]['LocationY']) for
-                         a in
-                         self.links}
+        # Coordinates are kept as an array with an integer index per node, so that distances and durations can be
+        # stored as node x node matrices. The dictionaries distance and duration are views on these matrices.
+        self.nodes = self.S + self.D + self.C
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.coordinates = self.locations.loc[self.nodes, ['LocationX', 'LocationY']].to_numpy(dtype=float)
+        self.distance_matrix = distance_matrix(self.coordinates, self.coordinates)
+        origin_index = np.array([self.node_index[i] for i in link_data['Origin']], dtype=int)
+        destination_index = np.array([self.node_index[j] for j in link_data['Destination']], dtype=int)
+        self.duration_matrix = np.zeros((len(self.nodes), len(self.nodes)), dtype=int)
+        self.duration_matrix[origin_index, destination_index] = link_data['Duration'].to_numpy(dtype=int)
+        self.distance = LinkMatrixView(self.distance_matrix, self.node_index, self.links)
+        self.duration = LinkMatrixView(self.duration_matrix, self.node_index, self.links)
         if not random:
-            self.demand = {self.demand_set[i]: demand_data['Amount'][i] for i in range(len(demand_data))}
-            self.cum_demand = {(c, p, t): sum(self.demand[c, p, f] for f in range(self.start, t + 1)
-                                              if (c, p, f) in self.demand_set) for (c, p, t) in
-                               self.customer_product_time}
+            self.demand = dict(zip(self.demand_set, demand_data['Amount']))
+            # Cumulative demand is computed as a running sum over time for every customer/product pair
+            self.cum_demand = {}
+            for c, p in ((c, p) for c in self.C for p in self.P):
+                total = 0
+                for t in self.T:
+                    total += self.demand.get((c, p, t), 0)
+                    self.cum_demand[c, p, t] = total
         else:
-            self.demand_mean = {self.demand_set[i]: demand_data['Expected Amount'][i] for i in range(len(demand_data))}
-            self.demand_dev = {self.demand_set[i]: demand_data['Standard Deviation'][i] for i in
-                               range(len(demand_data))}
-        self.backlog_pen = {self.customer_product[i]: backlog_data['Amount'][i] for i in
-                            range(len(backlog_data))}
+            self.demand_mean = dict(zip(self.demand_set, demand_data['Expected Amount']))
+            self.demand_dev = dict(zip(self.demand_set, demand_data['Standard Deviation']))
+        self.backlog_pen = dict(zip(self.customer_product, backlog_data['Amount']))
         self.min_prod = {(s, p): 0 for s in self.S for p in self.P}
         self.max_prod = {(s, p): 0 for s in self.S for p in self.P}
-        for i in range(len(production_data)):
-            self.min_prod[self.supplier_product[i]] = production_data['Minimum'][i]
-            self.max_prod[self.supplier_product[i]] = production_data['Maximum'][i]
+        self.min_prod.update(zip(self.supplier_product, production_data['Minimum']))
+        self.max_prod.update(zip(self.supplier_product, production_data['Maximum']))
         if random:
-            self.supplier_availability = {self.supplier_product[i]: production_data['Availability rate'][i]
-                                          for i in range(len(self.supplier_product))}
+            self.supplier_availability = dict(zip(self.supplier_product, production_data['Availability rate']))
         self.solution = {}
         self.objective = np.inf
 
         if random:
             self.scenarios = []
 
+    # Index sets are lazy products of the object sets, they are only materialized when iterated over
+    def build_index_sets(self):
+        self.link_product_time = ProductSet(self.links, self.P, self.T)
+        self.link_time = ProductSet(self.links, self.T)
+        self.supplier_product_time = ProductSet(self.S, self.P, self.T)
+        self.depot_time = ProductSet(self.D, self.T)
+        self.depot_product_time = ProductSet(self.D, self.P, self.T)
+        self.customer_product_time = ProductSet(self.C, self.P, self.T)
+        # Inventories are also defined in the period before the first period, which holds the initial inventory
+        self.dc_product_time = ProductSet(self.D_and_C, self.P, [self.T[0] - 1] + self.T)
+
+    # Returns a copy of this problem in which every bucket of consecutive periods is merged into a single period. A
+    # truck (and thereby a unit of capacity) in an aggregated period stands for a truck in each of the periods it
+    # contains, so the truck size, production limits and all costs per period are scaled by the bucket length.
+    # Durations are rounded up to whole buckets, so goods never arrive earlier than they could.
+    def aggregate_time(self, bucket):
+        aggregated = copy.copy(self)
+        aggregated.fingerprint = self.fingerprint + '_B' + str(bucket)
+        aggregated.end = self.start + math.ceil(len(self.T) / bucket) - 1
+        aggregated.T = list(range(self.start, aggregated.end + 1))
+        aggregated.build_index_sets()
+
+        def aggregated_period(t):
+            return self.start + (t - self.start) // bucket
+
+        def last_period(t):
+            return min(self.start + (t - self.start + 1) * bucket - 1, self.end)
+
+        aggregated.truck_size = self.truck_size * bucket
+        aggregated.min_prod = {key: value * bucket for key, value in self.min_prod.items()}
+        aggregated.max_prod = {key: value * bucket for key, value in self.max_prod.items()}
+        aggregated.holding_cost = {key: value * bucket for key, value in self.holding_cost.items()}
+        aggregated.backlog_pen = {key: value * bucket for key, value in self.backlog_pen.items()}
+        aggregated.distance_matrix = self.distance_matrix * bucket
+        aggregated.duration_matrix = np.ceil(self.duration_matrix / bucket).astype(int)
+        aggregated.distance = LinkMatrixView(aggregated.distance_matrix, self.node_index, self.links)
+        aggregated.duration = LinkMatrixView(aggregated.duration_matrix, self.node_index, self.links)
+        if not self.random:
+            aggregated.demand = {}
+            for (c, p, t), amount in self.demand.items():
+                key = (c, p, aggregated_period(t))
+                aggregated.demand[key] = aggregated.demand.get(key, 0) + amount
+            # The cumulative demand of an aggregated period is the one at the end of its last original period
+            aggregated.cum_demand = {(c, p, t): self.cum_demand[c, p, last_period(t)]
+                                     for c, p, t in aggregated.customer_product_time}
+        else:
+            # Demands of merged periods are summed, assuming they are independent
+            aggregated.demand_mean, variance = {}, {}
+            for c, p, t in self.demand_set:
+                key = (c, p, aggregated_period(t))
+                aggregated.demand_mean[key] = aggregated.demand_mean.get(key, 0) + self.demand_mean[c, p, t]
+                variance[key] = variance.get(key, 0) + self.demand_dev[c, p, t] ** 2
+            aggregated.demand_dev = {key: math.sqrt(value) for key, value in variance.items()}
+            aggregated.demand_set = list(aggregated.demand_mean.keys())
+            aggregated.scenarios = []
+        aggregated.solution = {}
+        aggregated.objective = np.inf
+        return aggregated
+
     # Function that updates this problem object's solution based on a solution file
     def read_solution(self, instance_name):
-        self.solution = {'x': {(i, j, p, str(t)): 0 for (i, j, p, t) in self.link_product_time},
-                         'l': {(i, j): 0 for (i, j) in self.links},
-                         'v': {(i, j): 0 for (i, j) in self.links},
-                         'k': {(i, j, str(t)): 0 for (i, j, t) in self.link_time},
-                         'r': {(s, p, str(t)): 0 for (s, p, t) in self.supplier_product_time},
-                         'I': {(i, p, str(t)): 0 for (i, p, t) in self.dc_product_time}}
+        values = {}
         # Read solution
         with open('Solutions/' + instance_name + '.sol', newline='\n') as file:
             reader = csv.reader((line.replace('  ', ' ') for line in file), delimiter=' ')
             header = next(reader)  # Skip header
-            self.objective = header[-1]
+            objective = header[-1]
             for var, value in reader:
                 name = tuple(var[2:-1].split(','))
-                if var[0] not in self.solution.keys():
-                    self.solution[var[0]] = {}
-                self.solution[var[0]][name] = float(value)
-
-    def generate_scenarios(self, N):
-        self.scenarios = []
-        for i in range(N):
-            availability = {(s, p, t): np.random.binomial(n=1, p=self.supplier_availability[s, p])
+                if var[0] not in values.keys():
+                    values[var[0]] = {}
+                values[var[0]][name] = float(value)
+        self.load_solution(values, objective)
+
+    # Function that updates this problem object's solution based on the variable values of a solved model
+    def load_solution(self, values, objective=np.inf):
+        self.solution = {'x': {(i, j, p, str(t)): 0 for (i, j, p, t) in self.link_product_time},
+                         'l': {(i, j): 0 for (i, j) in self.links},
+                         'v': {(i, j): 0 for (i, j) in self.links},
+                         'k': {(i, j, str(t)): 0 for (i, j, t) in self.link_time},
+                         'r': {(s, p, str(t)): 0 for (s, p, t) in self.supplier_product_time},
+                         'I': {(i, p, str(t)): 0 for (i, p, t) in self.dc_product_time}}
+        for var, var_values in values.items():
+            if var not in self.solution.keys():
+                self.solution[var] = {}
+            self.solution[var].update(var_values)
+        self.objective = objective
+
+    # Generates N scenarios. If keep is True, the existing scenarios are kept and only the missing ones are added.
+    # Scenarios are drawn from the global random state, unless a random generator (e.g. a RandomState) is given.
+    def generate_scenarios(self, N, keep=False, rng=None):
+        if rng is None:
+            rng = np.random
+        if not keep:
+            self.scenarios = []
+        for i in range(len(self.scenarios), N):
+            availability = {(s, p, t): rng.binomial(n=1, p=self.supplier_availability[s, p])
                             for s, p, t in self.supplier_product_time if (s, p) in self.supplier_product}
-            demand = {(c, p, t): np.random.normal(loc=self.demand_mean[c, p, t], scale=self.demand_dev[c, p, t])
+            demand = {(c, p, t): rng.normal(loc=self.demand_mean[c, p, t], scale=self.demand_dev[c, p, t])
                       for c, p, t in self.demand_set}
             cum_demand = {(c, p, t): sum([demand[c, p, f] for f in range(t) if (c, p, f) in self.demand_set])
                           for c, p, t in self.customer_product_time}
@@ -292,63 +510,77 @@ class Problem:
             })
 
     def compute_objective(self):
-        # Opening + capacity costs
-        tot_opening_costs = 0
-        tot_capacity_costs = 0
-        for link in self.links:
-            if self.solution['v'][link] > 0:
-                extra_opening_cost = self.opening_cost[link]
-                tot_opening_costs += extra_opening_cost
-                extra_capacity_cost = self.capacity_cost[link] * self.solution['v'][link]
-                tot_capacity_costs += extra_capacity_cost
+        # Links count as opened if they have a positive capacity
+        return self.objective_breakdown(open_links_by='v')['totals']['total']
+
+    # Computes all cost components of the solution at once from the solution arrays. Returns the costs per link, depot,
+    # customer and scenario as DataFrames, together with the totals. In the random case, all operational costs are
+    # averages over the scenarios.
+    def objective_breakdown(self, open_links_by='l'):
+        arrays = self.solution_arrays()
+        T = np.array(self.T)
+        N = arrays['x'].shape[3]
+        volume = np.array([self.product_volume[p] for p in self.P])
+        num_depots = len(self.D)
+        num_customers = len(self.C)
+        opened = arrays[open_links_by] > (0.5 if open_links_by == 'l' else 0)
+        # Link costs
+        trucks = arrays['k'][:, T].sum(axis=1)
+        distance = np.array([self.distance[link] for link in self.links])
+        link_costs = pd.DataFrame({
+            'Opened': opened,
+            'Opening': np.where(opened, [self.opening_cost[link] for link in self.links], 0),
+            'Capacity amount': arrays['v'],
+            'Capacity': np.array([self.capacity_cost[link] for link in self.links]) * arrays['v'],
+            'Trucks': trucks.mean(axis=1),
+            'Distance': np.where(opened, distance, 0) * trucks.mean(axis=1)
+        }, index=pd.MultiIndex.from_tuples(self.links, names=['Origin', 'Destination']))
+        # Depot costs (per scenario)
+        inventory_volume = np.einsum('dptn,p->dtn', arrays['I'][:num_depots][:, :, T], volume)
+        holding = np.array([self.holding_cost[d] for d in self.D])[:, None] * inventory_volume.sum(axis=1)
+        depot_costs = pd.DataFrame({
+            'Capacity': [self.capacity[d] for d in self.D],
+            'Total inventory': inventory_volume.sum(axis=1).mean(axis=1),
+            'Holding': holding.mean(axis=1)
+        }, index=pd.Index(self.D, name='Depot'))
+        # Customer costs (per scenario), quadratic backlog in the deterministic case and linear in the random case
+        delivered = arrays['I'][-num_customers:][:, :, T]
         if not self.random:
-            # Distance costs
-            tot_distance_costs = 0
-            for link in self.links:
-                if self.solution['v'][link] > 0:
-                    total_trucks_sent = sum([self.solution['k'][link + (str(t),)] for t in self.T])
-                    extra_distance_cost = total_trucks_sent * self.distance[link]
-                    tot_distance_costs += extra_distance_cost
-            # Holding costs
-            tot_holding_costs = 0
-            for d in self.D:
-                for p in self.P:
-                    extra_holding_cost = self.holding_cost[d] * sum([self.solution['I'][d, p, str(t)]
-                                                                     * self.product_volume[p] for t in self.T])
-                    tot_holding_costs += extra_holding_cost
-            # Backlog costs
-            tot_backlog_costs = 0
-            for c, p, t in self.customer_product_time:
-                extra_backlog = self.backlog_pen[c, p] * (
-                        self.solution['I'][c, p, str(t)] - self.cum_demand[c, p, t]) ** 2
-                tot_backlog_costs += extra_backlog
-            return tot_opening_costs + tot_capacity_costs + tot_distance_costs + tot_holding_costs + tot_backlog_costs
+            cum_demand = np.array([[[self.cum_demand[c, p, t] for t in self.T] for p in self.P]
+                                   for c in self.C])[:, :, :, None]
         else:
-            tot_distance_costs = 0
-            tot_holding_costs = 0
-            tot_backlog_costs = 0
-            N = len(self.scenarios)
-            for theta in range(N):
-                # Distance costs
-                for (i, j) in self.links:
-                    if self.solution['v'][i, j] > 0:
-                        total_trucks_sent = sum([self.solution['k'][i, j, str(t), str(theta)] for t in self.T])
-                        extra_distance_cost = total_trucks_sent * self.distance[i, j]
-                        tot_distance_costs += extra_distance_cost
-                # Holding costs
-                for d in self.D:
-                    for p in self.P:
-                        extra_holding_cost = self.holding_cost[d] * sum([self.solution['I'][d, p, str(t), str(theta)]
-                                                                         * self.product_volume[p] for t in self.T])
-                        tot_holding_costs += extra_holding_cost
-                # Backlog costs
-                for c, p, t in self.customer_product_time:
-                    extra_backlog = self.backlog_pen[c, p] * abs((self.solution['I'][c, p, str(t), str(theta)]
-                                                                  - self.scenarios[theta]['cum_demand'][c, p, t]))
-                    tot_backlog_costs += extra_backlog
-            tot_objective = tot_opening_costs + tot_capacity_costs + \
-                            (1 / N) * (tot_distance_costs + tot_holding_costs + tot_backlog_costs)
-            return tot_objective
+            cum_demand = np.array([[[[scenario['cum_demand'][c, p, t] for scenario in self.scenarios]
+                                     for t in self.T] for p in self.P] for c in self.C])
+        deviation = delivered - cum_demand
+        deviation = deviation ** 2 if not self.random else np.abs(deviation)
+        backlog_pen = np.array([[self.backlog_pen[c, p] for p in self.P] for c in self.C])
+        backlog = np.einsum('cptn,cp->cn', deviation, backlog_pen)
+        customer_costs = pd.DataFrame({
+            'Backlog': backlog.mean(axis=1)
+        }, index=pd.Index(self.C, name='Customer'))
+        # Scenario costs
+        scenario_costs = pd.DataFrame({
+            'Distance': (np.where(opened, distance, 0)[:, None] * trucks).sum(axis=0),
+            'Holding': holding.sum(axis=0),
+            'Backlog': backlog.sum(axis=0)
+        }, index=pd.RangeIndex(N, name='Scenario'))
+        scenario_costs['Total'] = link_costs['Opening'].sum() + link_costs['Capacity'].sum() \
+            + scenario_costs.sum(axis=1)
+        totals = {
+            'opening': link_costs['Opening'].sum(),
+            'capacity': link_costs['Capacity'].sum(),
+            'distance': scenario_costs['Distance'].mean(),
+            'holding': scenario_costs['Holding'].mean(),
+            'backlog': scenario_costs['Backlog'].mean()
+        }
+        totals['total'] = sum(totals.values())
+        return {
+            'links': link_costs,
+            'depots': depot_costs,
+            'customers': customer_costs,
+            'scenarios': scenario_costs,
+            'totals': totals
+        }
 
     # Log the amount of trucks sent over each link at each point in time
     def log_k(self):
@@ -362,193 +594,36 @@ class Problem:
         for link, trucks in k.items():
             print(link, trucks)
 
-    # Function that outputs the buildup of different cost types
-    def log_objective(self, summary_only=False):
-        print()
-        print('Objective overview:')
-        print('-' * 70)
-        # Opening costs
-        tot_opening_costs = 0
-        for link in self.links:
-            if link in self.solution['l'].keys():
-                if self.solution['l'][link] == 1:
-                    extra_opening_cost = self.opening_cost[link]
-                    if not summary_only:
-                        print(link, '| Cost:', extra_opening_cost)
-                    tot_opening_costs += extra_opening_cost
-        if not summary_only:
-            print('Total opening costs:', round(tot_opening_costs, 2))
+    # Function that outputs the buildup of different cost types. The breakdown is computed once; it is printed to the
+    # console (only the summary if summary_only is True, nothing if verbose is False) and optionally written to CSV
+    # or JSON files with the given base filename.
+    def log_objective(self, summary_only=False, verbose=True, file_format=None, filename=None):
+        breakdown = self.objective_breakdown()
+        totals = breakdown['totals']
+        if verbose:
+            print()
+            print('Objective overview:')
             print('-' * 70)
-        # Capacity costs
-        tot_capacity_costs = 0
-        for link in self.links:
-            if link in self.solution['v'].keys():
-                if self.solution['v'][link] > 0:
-                    extra_capacity_cost = self.capacity_cost[link] * self.solution['v'][link]
-                    if not summary_only:
-                        print(link, '| Amount: ', round(self.solution['v'][link], 2), '| Cost per:',
-                              self.capacity_cost[link], '| Total cost:', round(extra_capacity_cost, 2))
-                    tot_capacity_costs += extra_capacity_cost
-        if not summary_only:
-            print('Total capacity costs:', round(tot_capacity_costs, 2))
-            print('-' * 70)
-        if not self.random:
-            # Distance costs
-            tot_distance_costs = 0
-            for link in self.links:
-                if link in self.solution['v'].keys():
-                    if self.solution['v'][link] > 0:
-                        total_trucks_sent = sum([self.solution['k'][link + (str(t),)] for t in self.T])
-                        extra_distance_cost = total_trucks_sent * self.distance[link]
-                        if not summary_only:
-                            print(link, '| Total trucks sent on link: ', round(total_trucks_sent),
-                                  '| Cost per:', round(self.distance[link], 2), '| Total cost:',
-                                  round(extra_distance_cost, 2))
-                        tot_distance_costs += extra_distance_cost
-            if not summary_only:
-                print('Total distance costs:', round(tot_distance_costs, 2))
-                print('-' * 70)
-            # Holding costs
-            tot_holding_costs = 0
-            for d in self.D:
-                if not summary_only:
-                    print(d, '| Holding costs:', self.holding_cost[d], 'Capacity:', self.capacity[d])
-                for p in self.P:
-                    if not summary_only:
-                        print(d, p, '| Inventory:', [round(self.solution['I'][d, p, str(t)] * self.product_volume[p], 2)
-                                                     for t in self.T])
-                    extra_holding_cost = self.holding_cost[d] * sum([self.solution['I'][d, p, str(t)]
-                                                                     * self.product_volume[p] for t in self.T])
-                    if not summary_only:
-                        print(d, p, '| Total inventory:', round(sum([round(self.solution['I'][d, p, str(t)]
-                                                                           * self.product_volume[p], 2)
-                                                                     for t in self.T]), 2),
-                              '| Total cost:', round(extra_holding_cost, 2))
-                    tot_holding_costs += extra_holding_cost
             if not summary_only:
-                print('Total holding costs:', round(tot_holding_costs, 2))
-                print('-' * 70)
-            # Backlog costs
-            tot_backlog_costs = 0
-            cum_demand = self.cum_demand if not self.random else self.scenarios[0]['cum_demand']
-            for c in self.C:
-                customer_backlog = 0
-                if not summary_only:
-                    print(c, '|')
-                    print('-' * 70)
-                for p in self.P:
-                    if not summary_only:
-                        print(c, p, '|', [round(cum_demand[c, p, t], 2) for t in self.T],
-                              '- Cumulative demand over time')
-                        print(c, p, '|', [round(self.solution['I'][c, p, str(t)], 2) for t in self.T],
-                              '- Total delivered over time')
-                    product_backlog = 0
-                    for t in self.T:
-                        product_backlog += self.backlog_pen[c, p] * ((self.solution['I'][c, p, str(t)]
-                                                                      - cum_demand[c, p, t]) ** 2)
-                    customer_backlog += product_backlog
-                    if not summary_only:
-                        print(c, p, '| Product backlog costs:', product_backlog)
-                        print('-' * 70)
-                if not summary_only:
-                    print(c, '| Customer backlog costs:', round(customer_backlog, 2))
+                for table in ['links', 'depots', 'customers'] + (['scenarios'] if self.random else []):
+                    print(table.capitalize(), '|')
+                    print(breakdown[table].round(2).to_string())
                     print('-' * 70)
-            for c, p, t in self.customer_product_time:
-                extra_backlog = self.backlog_pen[c, p] * (self.solution['I'][c, p, str(t)] - cum_demand[c, p, t]) ** 2
-                tot_backlog_costs += extra_backlog
-            if not summary_only:
-                print('Total backlog costs:', round(tot_backlog_costs, 2))
-                print('-' * 70)
-            tot_objective = tot_opening_costs + tot_capacity_costs + tot_distance_costs \
-                            + tot_holding_costs + tot_backlog_costs
-        else:
-            tot_distance_costs = 0
-            tot_holding_costs = 0
-            tot_backlog_costs = 0
-            N = len(self.scenarios)
-            for theta in range(N):
-                if not summary_only:
-                    print('SCENARIO', theta)
-                    print('-' * 70)
-                # Distance costs
-                tot_distance_costs = 0
-                for (i, j) in self.links:
-                    if (i, j) in self.solution['v'].keys():
-                        if self.solution['v'][i, j] > 0:
-                            total_trucks_sent = sum([self.solution['k'][i, j, str(t), str(theta)] for t in self.T])
-                            extra_distance_cost = total_trucks_sent * self.distance[i, j]
-                            if not summary_only:
-                                print(i, j, '| Total trucks sent on link: ', round(total_trucks_sent),
-                                      '| Cost per:', round(self.distance[i, j], 2), '| Total cost:',
-                                      round(extra_distance_cost, 2))
-                            tot_distance_costs += extra_distance_cost / N
-                if not summary_only:
-                    print('Total distance costs:', round(tot_distance_costs, 2))
-                    print('-' * 70)
-                # Holding costs
-                for d in self.D:
-                    if not summary_only:
-                        print(d, '| Holding costs:', self.holding_cost[d], 'Capacity:', self.capacity[d])
-                    for p in self.P:
-                        if not summary_only:
-                            print(d, p, '| Inventory:',
-                                  [round(self.solution['I'][d, p, str(t), str(theta)] * self.product_volume[p], 2)
-                                   for t in self.T])
-                        extra_holding_cost = self.holding_cost[d] * sum([self.solution['I'][d, p, str(t), str(theta)]
-                                                                         * self.product_volume[p] for t in self.T])
-                        if not summary_only:
-                            print(d, p, '| Total inventory:',
-                                  round(sum([round(self.solution['I'][d, p, str(t), str(theta)]
-                                                   * self.product_volume[p], 2)
-                                             for t in self.T]), 2),
-                                  '| Total cost:', round(extra_holding_cost, 2))
-                        tot_holding_costs += extra_holding_cost / N
-                if not summary_only:
-                    print('Total holding costs:', round(tot_holding_costs, 2))
-                    print('-' * 70)
-                # Backlog costs
-                cum_demand = self.scenarios[theta]['cum_demand']
-                for c in self.C:
-                    customer_backlog = 0
-                    if not summary_only:
-                        print(c, '|')
-                        print('-' * 70)
-                    for p in self.P:
-                        if not summary_only:
-                            print(c, p, '|', [round(cum_demand[c, p, t], 2) for t in self.T],
-                                  '- Cumulative demand over time')
-                            print(c, p, '|', [round(self.solution['I'][c, p, str(t), str(theta)], 2) for t in self.T],
-                                  '- Total delivered over time')
-                        product_backlog = 0
-                        for t in self.T:
-                            product_backlog += self.backlog_pen[c, p] * abs(self.solution['I'][c, p, str(t), str(theta)]
-                                                                          - cum_demand[c, p, t])
-                        customer_backlog += product_backlog
-                        if not summary_only:
-                            print(c, p, '| Product backlog costs:', product_backlog)
-                            print('-' * 70)
-                    if not summary_only:
-                        print(c, '| Customer backlog costs:', round(customer_backlog, 2))
-                        print('-' * 70)
-                for c, p, t in self.customer_product_time:
-                    extra_backlog = self.backlog_pen[c, p] * abs(
-                        self.solution['I'][c, p, str(t), str(theta)] - cum_demand[c, p, t])
-                    tot_backlog_costs += extra_backlog / N
-                if not summary_only:
-                    print('Total backlog costs:', round(tot_backlog_costs, 2))
-                    print('-' * 70)
-            tot_objective = tot_opening_costs + tot_capacity_costs + tot_distance_costs + tot_holding_costs + tot_backlog_costs
-        print('Total opening costs  |', round(tot_opening_costs, 2))
-        print('Total capacity costs |', round(tot_capacity_costs, 2))
-        print('Total distance costs |', round(tot_distance_costs, 2))
-        print('Total holding costs  |', round(tot_holding_costs, 2))
-        print('Total backlog costs  |', round(tot_backlog_costs, 2))
-        print('-' * 70)
-        print('Total costs          |', round(tot_objective, 2))
-        print('-' * 70)
+            print('Total opening costs  |', round(totals['opening'], 2))
+            print('Total capacity costs |', round(totals['capacity'], 2))
+            print('Total distance costs |', round(totals['distance'], 2))
+            print('Total holding costs  |', round(totals['holding'], 2))
+            print('Total backlog costs  |', round(totals['backlog'], 2))
+            print('-' * 70)
+            print('Total costs          |', round(totals['total'], 2))
+            print('-' * 70)
+        if file_format is not None:
+            write_report(breakdown, filename if filename is not None else 'Solutions/' + self.instance_name,
+                         file_format)
         return {
-            'backlog': tot_backlog_costs,
-            'total': tot_objective
+            'backlog': totals['backlog'],
+            'total': totals['total'],
+            'breakdown': breakdown
         }
 
     def log_production(self):
@@ -573,64 +648,135 @@ class Problem:
                         print(p, '|', production)
                     print('-' * 70)
 
-    def verify_constraints(self):
-        # 1 - Link opening constraint
-        for link in self.links:
-            assert self.solution['l'][link] * 10000 >= self.solution['v'][link], 'Constraint 1 violation'
-        # 2 - Link capacity constraint
-        for link in self.links:
-            for t in self.T:
-                t = str(t)
-                assert round(self.solution['k'][link[0], link[1], t]) <= round(self.solution['v'][link])
-        # 3 - Required trucks constraint
-        for i, j in self.links:
-            for t in self.T:
-                t = str(t)
-                volume = sum([self.product_volume[p] * self.solution['x'][i, j, p, t] for p in self.P])
-                assert self.solution['k'][i, j, t] >= round(volume / self.truck_size)
-        # 4 - Min production constraint
-        for s, p, t in self.supplier_product_time:
-            t = str(t)
-            production = sum([self.solution['x'][s, j, p, t] for j in self.D_and_C])
-            assert round(production, 2) >= self.min_prod[s, p] * self.solution['r'][s, p, t]
-        # 5 - Max production constraint
-        for s, p, t in self.supplier_product_time:
-            t = str(t)
-            production = sum([self.solution['x'][s, j, p, t] for j in self.D_and_C])
-            assert round(production, 2) <= self.max_prod[s, p] * self.solution['r'][s, p, t]
-        # 6 - Depot outflow constraint
-        for d, p, t in self.depot_product_time:
-            outflow = sum([self.solution['x'][d, j, p, str(t)] for j in self.D_and_C if (d, j) in self.links])
-            inflow = sum([self.solution['x'][j, d, p, str(t - self.duration[j, d])] for j in self.S_and_D
-                          if (j, d) in self.links and t - self.duration[j, d] >= self.start])
-            assert round(outflow, 2) <= round(self.solution['I'][d, p, str(t - 1)] + inflow, 2) + 0.01
-        # 7 - Depot capacity constraint
-        for d in self.D:
-            for t in self.T:
-                t = str(t)
-                volume = sum([self.product_volume[p] * self.solution['I'][d, p, t] for p in self.P])
-                assert volume <= self.capacity[d]
-        # 8 - Flow constraints
-        for i, p, t in self.dc_product_time:
-            if t > 0:
-                outflow = sum([self.solution['x'][i, j, p, str(t)] for j in self.D_and_C if (i, j) in self.links])
-                inflow = sum([self.solution['x'][j, i, p, str(t - self.duration[j, i])] for j in self.S_and_D
-                              if (j, i) in self.links and t - self.duration[j, i] >= self.start])
-                assert round(self.solution['I'][i, p, str(t)], 4) - round(self.solution['I'][i, p, str(t - 1)] + inflow
-                                                                          - outflow, 4) <= 0.0001
-        # 9 - Inventories start at 0
-        for i in self.D_and_C:
-            for p in self.P:
-                assert self.solution['I'][i, p, '0'] == 0
-        # 10 - Total inventories must match cumulative demand
-        for c in self.C:
-            for p in self.P:
-                assert round(self.solution['I'][c, p, str(self.end)], 5) == round(self.cum_demand[c, p, self.end], 5)
-        print('Constraints succesfully verified.')
-        return
+    # Converts the solution into arrays indexed by position in self.links, self.P, self.S, self.D_and_C, time period
+    # (0 to self.end) and scenario (a single scenario in the deterministic case)
+    def solution_arrays(self):
+        N = len(self.scenarios) if self.random else 1
+        num_periods = self.end + 1
+        link_position = {link: a for a, link in enumerate(self.links)}
+        product_position = {p: i for i, p in enumerate(self.P)}
+        supplier_position = {s: i for i, s in enumerate(self.S)}
+        dc_position = {node: i for i, node in enumerate(self.D_and_C)}
+        arrays = {
+            'x': np.zeros((len(self.links), len(self.P), num_periods, N)),
+            'k': np.zeros((len(self.links), num_periods, N)),
+            'v': np.zeros(len(self.links)),
+            'l': np.zeros(len(self.links)),
+            'r': np.zeros((len(self.S), len(self.P), num_periods)),
+            'I': np.zeros((len(self.D_and_C), len(self.P), num_periods, N))
+        }
+        for (i, j, p, t, *theta), value in self.solution['x'].items():
+            if (i, j) in link_position:
+                arrays['x'][link_position[i, j], product_position[p], int(t), int(theta[0]) if theta else 0] = value
+        for (i, j, t, *theta), value in self.solution['k'].items():
+            if (i, j) in link_position:
+                arrays['k'][link_position[i, j], int(t), int(theta[0]) if theta else 0] = value
+        for var in ['v', 'l']:
+            for link, value in self.solution[var].items():
+                if link in link_position:
+                    arrays[var][link_position[link]] = value
+        if 'r' in self.solution.keys():
+            for (s, p, t), value in self.solution['r'].items():
+                arrays['r'][supplier_position[s], product_position[p], int(t)] = value
+        for (i, p, t, *theta), value in self.solution['I'].items():
+            arrays['I'][dc_position[i], product_position[p], int(t), int(theta[0]) if theta else 0] = value
+        return arrays
+
+    # Incidence matrix (nodes x links) of the links that leave (or enter) each of the given nodes
+    def incidence_matrix(self, nodes, outgoing=True):
+        node_position = {node: i for i, node in enumerate(nodes)}
+        matrix = np.zeros((len(nodes), len(self.links)))
+        for a, (i, j) in enumerate(self.links):
+            node = i if outgoing else j
+            if node in node_position:
+                matrix[node_position[node], a] = 1
+        return matrix
+
+    # Quantities that arrive over each link in each period: departures shifted forward by the link duration
+    def arrivals(self, x):
+        durations = np.array([self.duration[link] for link in self.links], dtype=int)
+        arrivals = np.zeros_like(x)
+        for duration in np.unique(durations):
+            links = durations == duration
+            arrivals[links, :, duration:] = x[links, :, :x.shape[2] - duration]
+        return arrivals
+
+    # Checks all constraint families at once and reports the number of violations and the maximum and total violation
+    # of each family, instead of stopping at the first violation
+    def verify_constraints(self, tolerance=1e-4, verbose=True):
+        arrays = self.solution_arrays()
+        x, k, v, l, r, I = arrays['x'], arrays['k'], arrays['v'], arrays['l'], arrays['r'], arrays['I']
+        N = x.shape[3]
+        T = np.array(self.T)
+        volume = np.array([self.product_volume[p] for p in self.P])
+        num_depots = len(self.D)
+        supplier_out = self.incidence_matrix(self.S)
+        dc_out = self.incidence_matrix(self.D_and_C)
+        dc_in = self.incidence_matrix(self.D_and_C, outgoing=False)
+        production = np.einsum('sa,aptn->sptn', supplier_out, x)[:, :, T]
+        outflow = np.einsum('ia,aptn->iptn', dc_out, x)
+        inflow = np.einsum('ia,aptn->iptn', dc_in, self.arrivals(x))
+        min_prod = np.array([[self.min_prod[s, p] for p in self.P] for s in self.S])
+        max_prod = np.array([[self.max_prod[s, p] for p in self.P] for s in self.S])
+        # The model raises the bounds to any capacity imposed on a link, so the capacities of the solution count too
+        upper_bounds = link_upper_bounds(self, {link: self.solution['v'][link] for link in self.links})
+        violations = {
+            # 1 - Link opening constraint
+            'Link opening': v - np.array([upper_bounds[link] for link in self.links]) * l,
+            # 2 - Link capacity constraint
+            'Link capacity': k[:, T] - v[:, None, None],
+            # 3 - Required trucks constraint
+            'Required trucks': np.einsum('aptn,p->atn', x, volume)[:, T] / self.truck_size - k[:, T],
+            # 6 - Depot outflow constraint
+            'Depot outflow': outflow[:num_depots][:, :, T] - I[:num_depots][:, :, T - 1] - inflow[:num_depots][:, :, T],
+            # 7 - Depot capacity constraint
+            'Depot capacity': np.einsum('dptn,p->dtn', I[:num_depots][:, :, T], volume)
+            - np.array([self.capacity[d] for d in self.D])[:, None, None],
+            # 8 - Flow constraints
+            'Inventory flow': np.abs(I[:, :, T] - I[:, :, T - 1] - inflow[:, :, T] + outflow[:, :, T]),
+            # 9 - Inventories start at 0
+            'Initial inventory': np.abs(I[:, :, self.start - 1])
+        }
+        if not self.random:
+            # 4 - Min production constraint
+            violations['Minimum production'] = (min_prod[:, :, None] * r[:, :, T])[:, :, :, None] - production
+            # 5 - Max production constraint
+            violations['Maximum production'] = production - (max_prod[:, :, None] * r[:, :, T])[:, :, :, None]
+            # 10 - Total inventories must match cumulative demand
+            num_customers = len(self.C)
+            cum_demand = np.array([[self.cum_demand[c, p, self.end] for p in self.P] for c in self.C])
+            violations['Final demand'] = np.abs(I[-num_customers:, :, self.end, 0] - cum_demand)
+        else:
+            # 5 - Max production constraint, production is limited by the availability in each scenario
+            availability = np.zeros((len(self.S), len(self.P), len(T), N))
+            for theta, scenario in enumerate(self.scenarios):
+                for (s, p, t), available in scenario['availability'].items():
+                    availability[self.S.index(s), self.P.index(p), t - self.start, theta] = available
+            violations['Maximum production'] = production - max_prod[:, :, None, None] * availability
+        # Summarize each family
+        report = {}
+        for family, violation in violations.items():
+            violation = np.maximum(violation, 0)
+            report[family] = {
+                'violations': int(np.sum(violation > tolerance)),
+                'max': float(np.max(violation, initial=0)),
+                'total': float(np.sum(violation))
+            }
+        if verbose:
+            if all(family_report['violations'] == 0 for family_report in report.values()):
+                print('Constraints succesfully verified.')
+            else:
+                print()
+                print('Constraint violations:')
+                print('-' * 70)
+                for family, family_report in report.items():
+                    print(family.ljust(20), '| Violations:', family_report['violations'],
+                          '| Max:', round(family_report['max'], 4), '| Total:', round(family_report['total'], 4))
+                print('-' * 70)
+        return report
 
     # Call display on this problem's solution showing only opened links and their capacities
-    def display(self, integer=False):
+    def display(self, integer=False, name=None):
         disp = Display(self)
         disp.draw(0, {'show_capacities': True, 'show_trucks': False, 'show_transport': False, 'show_inventory': False,
-                      'integer': integer})
+                      'integer': integer}, name)
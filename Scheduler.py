@@ -0,0 +1,37 @@
+import math
+import time
+
+
+class Scheduler:
+    def __init__(self, total_time=None, shares=None, stages=None):
+        self.deadline = math.inf if total_time is None else time.time() + total_time
+        self.shares = shares if shares is not None else {}
+        self.stages = stages if stages is not None else list(self.shares.keys())
+        self.stage_deadline = self.deadline
+
+    # Remaining time until the global deadline
+    def remaining(self):
+        return max(self.deadline - time.time(), 0)
+
+    # Start a stage; it receives its share of the remaining time relative to the stages that still have to run.
+    # Time that an earlier stage did not use is thereby automatically passed on to the later stages.
+    def start_stage(self, stage):
+        if self.deadline == math.inf or stage not in self.shares.keys():
+            self.stage_deadline = self.deadline
+            return
+        remaining_stages = self.stages[self.stages.index(stage):]
+        total_share = sum(self.shares[s] for s in remaining_stages if s in self.shares.keys())
+        self.stage_deadline = time.time() + self.remaining() * self.shares[stage] / total_share
+
+    def stage_remaining(self):
+        return max(min(self.stage_deadline, self.deadline) - time.time(), 0)
+
+    def stage_expired(self):
+        return self.stage_remaining() <= 0
+
+    # Time limit for a single solve within the current stage, limited by its own time limit (if any)
+    def time_limit(self, limit=None):
+        remaining = self.stage_remaining()
+        if limit is not None:
+            remaining = min(remaining, limit)
+        return None if remaining == math.inf else remaining
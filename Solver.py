@@ -1,12 +1,25 @@
 import math
 import copy
 import time
+import json
+import hashlib
 from statistics import stdev
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import matplotlib.pyplot as plt
 
-from Model import Model
+from Model import Model, write_solution
+from Construction import construct_solution
+from Checkpoint import Checkpoint
+from Cache import Cache
+from Environment import EnvironmentPool, get_profile
+from Scheduler import Scheduler
+
+# Stages of the heuristic in the order in which they are completed
+HEURISTIC_STAGES = ['step_1', 'step_2', 'step_3', 'local_search', 'step_4']
+HEURISTIC_STAGE_NAMES = {'step_1': 'Step 1', 'step_2': 'Step 2', 'step_3': 'Step 3', 'local_search': 'Local search',
+                         'step_4': 'Step 4'}
 
 
 # Exact solving of the problem
@@ -20,12 +33,243 @@ def solve(problem, settings=None, bounds=None):
     return problem
 
 
+# Solve a model of the problem, reusing the result of an identical earlier solve if it is in the cache
+def solve_model(problem, settings=None, bounds=None, parameters=None, stopping_criteria=None, instance_name=None,
+                surpress_logs=True, write_model=False, start=None, threads=None, time_limit=None, cache=None,
+                profile=None):
+    # Solver parameters of the profile (and the number of threads) are set on the environment of the model
+    environment = get_profile(profile)
+    if threads is not None:
+        environment['Threads'] = threads
+    if cache is not None:
+        key = cache.key(problem, settings, bounds, parameters, stopping_criteria, Model.solver,
+                        EnvironmentPool.profile(environment))
+        entry = cache.get(key, stopping_criteria)
+        if entry is not None:
+            if instance_name and entry['solution'] is not None:
+                write_solution(instance_name, entry['solution'], entry['objective'])
+            return entry['objective'], entry['solution']
+    # The time limit imposed by the scheduler is not part of the cache key, it only cuts the solve short
+    if time_limit is not None:
+        stopping_criteria = dict(stopping_criteria) if stopping_criteria is not None else {}
+        stopping_criteria['time'] = min(stopping_criteria.get('time', time_limit), time_limit)
+    model = Model(problem, settings, bounds, surpress_logs=surpress_logs, parameters=parameters,
+                  environment=environment)
+    if write_model:
+        model.write(instance_name)
+    if start is not None:
+        model.set_start(start)
+    objective = model.solve(instance_name, stopping_criteria)
+    solution = model.get_solution() if objective < np.inf else None
+    if cache is not None and not (time_limit is not None and model.status == 9):
+        # A solve that was stopped by its bound is only reusable for candidates that must beat a similar bound
+        lower_bound = model.get_bound() if model.status == 15 else None
+        cache.put(key, objective, solution, lower_bound)
+    return objective, solution
+
+
+# Solve a model of the problem over overlapping time windows (rolling horizon). The capacities are decided once
+# through their bounds, while the operational decisions are solved window by window. After each window, all periods
+# up to the overlap with the next window are fixed; their shipments and final inventories are carried over into the
+# next window. Returns the objective of the combined solution, together with that solution.
+def solve_rolling_horizon(problem, settings=None, bounds=None, parameters=None, stopping_criteria=None,
+                          instance_name=None, window=10, overlap=2, surpress_logs=True, time_limit=None, profile=None):
+    if overlap >= window:
+        raise ValueError('The overlap must be smaller than the window length')
+    deadline = None if time_limit is None else time.time() + time_limit
+    window_problem = copy.copy(problem)
+    solution = {}
+    first = problem.start
+    while True:
+        last = min(first + window - 1, problem.end)
+        window_problem.T = list(range(first, last + 1))
+        window_problem.build_index_sets()
+        # The remaining time is divided evenly over the remaining windows
+        criteria = dict(stopping_criteria) if stopping_criteria is not None else {}
+        if deadline is not None:
+            remaining_windows = math.ceil((problem.end - last) / (window - overlap)) + 1
+            window_time = max(deadline - time.time(), 0) / remaining_windows
+            criteria['time'] = min(criteria.get('time', window_time), window_time)
+        model = Model(window_problem, settings, bounds, surpress_logs=surpress_logs, parameters=parameters,
+                      environment=get_profile(profile), history=solution)
+        if model.solve(stopping_criteria=criteria) == np.inf:
+            return np.inf, None
+        # Fix all periods up to the start of the next window (the last window is fixed entirely)
+        fixed_until = last if last == problem.end else last - overlap
+        for var, values in model.get_solution().items():
+            if var not in solution.keys():
+                solution[var] = {}
+            for index, value in values.items():
+                if var in ['l', 'v'] or int(index[3 if var == 'x' else 2]) <= fixed_until:
+                    solution[var][index] = value
+        if last == problem.end:
+            break
+        first = fixed_until + 1
+    # The objective of the combined solution is computed over the entire horizon
+    evaluated_problem = copy.copy(problem)
+    evaluated_problem.load_solution(solution)
+    objective = evaluated_problem.compute_objective()
+    if instance_name:
+        write_solution(instance_name, solution, objective)
+    return objective, solution
+
+
+# Relax-and-fix: the integer model is solved window by window. In each window the trucks of its periods are
+# integer, those of earlier windows are fixed at their values and those of later windows are continuous, while the
+# capacities remain integer within their bounds throughout. Every window starts from the solution of the previous one.
+# The first window is a relaxation of the integer model, so its bound also gives the gap of the final solution. Returns
+# the objective, the solution and that gap.
+def relax_and_fix(problem, settings=None, bounds=None, parameters=None, stopping_criteria=None, instance_name=None,
+                  window=10, surpress_logs=True, time_limit=None, profile=None):
+    # The time limit of the stopping criteria holds for all windows together, as does the given time limit
+    total_time = None if stopping_criteria is None else stopping_criteria.get('time')
+    if time_limit is not None:
+        total_time = time_limit if total_time is None else min(total_time, time_limit)
+    deadline = None if total_time is None else time.time() + total_time
+    settings = {} if settings is None else dict(settings)
+    bounds = {} if bounds is None else dict(bounds)
+    bounds['k'] = {}
+    solution = None
+    objective = lower_bound = np.inf
+    first = problem.start
+    while first <= problem.end:
+        last = min(first + window - 1, problem.end)
+        # The remaining time is divided evenly over the remaining windows
+        criteria = dict(stopping_criteria) if stopping_criteria is not None else {}
+        if deadline is not None:
+            criteria['time'] = max(deadline - time.time(), 0) / (math.ceil((problem.end - last) / window) + 1)
+        settings['integer_periods'] = (first, last)
+        model = Model(problem, settings, bounds, surpress_logs=surpress_logs, parameters=parameters,
+                      environment=get_profile(profile))
+        if solution is not None:
+            model.set_start(solution)
+        objective = model.solve(stopping_criteria=criteria)
+        if objective == np.inf:
+            return np.inf, None, np.inf
+        if first == problem.start:
+            lower_bound = model.get_bound()
+        solution = model.get_solution()
+        # The (integer) trucks of this window are fixed in all later windows
+        for index, value in solution['k'].items():
+            if first <= int(index[2]) <= last:
+                bounds['k'][index[:2] + tuple(int(i) for i in index[2:])] = {'lb': round(value), 'ub': round(value)}
+        first = last + 1
+    if instance_name:
+        write_solution(instance_name, solution, objective)
+    gap = (objective - lower_bound) / abs(objective) if objective != 0 else 0
+    return objective, solution, gap
+
+
 # Heuristic method applied to problem
-def heuristic(problem, settings, create_initial_solution=True):
-    time_used = []
+def heuristic(problem, settings, create_initial_solution=True, resume=False):
+    # Load the latest checkpoint of this instance if we are resuming an interrupted run
+    checkpoint = Checkpoint(problem.instance_name)
+    key = checkpoint_key(problem, settings)
+    state = checkpoint.load() if resume else None
+    if state is None:
+        state = {'stage': None, 'time_used': {}, 'key': key}
+    else:
+        if state.get('key') != key:
+            raise ValueError('The checkpoint of ' + problem.instance_name + ' was made with other settings or '
+                             'scenarios, set resume to False to start over')
+        print()
+        print('Resuming heuristic from checkpoint (last completed stage:', str(state['stage']) + ')')
+        if problem.random:
+            problem.scenarios = state['scenarios']
+        np.random.set_state(state['random_state'])
+    time_used = state['time_used']
+    # Solver parameters shared by all models are set once on the pooled environments
+    EnvironmentPool.configure(settings.get('environment'))
+    # The global time budget is divided over the stages by the scheduler
+    scheduler = Scheduler()
+    if 'time_budget' in settings.keys() and settings['time_budget']['total'] is not None:
+        scheduler = Scheduler(settings['time_budget']['total'], settings['time_budget']['shares'], HEURISTIC_STAGES)
+    cache = None
+    if 'cache' in settings.keys() and settings['cache']['enabled']:
+        cache = Cache(max_entries=settings['cache']['max_entries'], max_size=settings['cache']['max_size'])
     # Step 1 - Create or load initial solution.
     # --------------------------------------------------------------------------------------
-    start_time = time.time()
+    if not stage_completed(state, 'step_1'):
+        start_time = time.time()
+        scheduler.start_stage('step_1')
+        step_1(problem, settings, create_initial_solution, cache, scheduler)
+        time_used['step_1'] = time.time() - start_time
+        save_checkpoint(checkpoint, state, 'step_1', problem, problem.compute_objective())
+    else:
+        problem.solution = state['step_1_solution']
+    original_problem = copy.deepcopy(problem)
+    if state['stage'] != 'step_1':
+        restore_links(problem, state)
+    current_objective = state['objective']
+    # Step 2 - Mass link dropping (all low capacity links are removed if improvement found)
+    # --------------------------------------------------------------------------------------
+    if not stage_completed(state, 'step_2'):
+        start_time = time.time()
+
+        def save_step_2_progress(current_capacity):
+            state['step_2'] = {'current_capacity': current_capacity}
+            checkpoint.save(state)
+
+        scheduler.start_stage('step_2')
+        problem, current_objective = step_2(problem, settings, current_objective, state.get('step_2'),
+                                            save_step_2_progress, cache, scheduler)
+        time_used['step_2'] = time.time() - start_time
+        save_checkpoint(checkpoint, state, 'step_2', problem, current_objective)
+    # Step 3 - Dropping individual links
+    # --------------------------------------------------------------------------------------
+    if not stage_completed(state, 'step_3'):
+        start_time = time.time()
+
+        def save_step_3_progress(start_problem, start_objective, progress):
+            state['links'] = start_problem.links
+            state['solution'] = start_problem.solution
+            state['objective'] = start_objective
+            state['step_3'] = progress
+            checkpoint.save(state)
+
+        scheduler.start_stage('step_3')
+        current_objective = step_3(problem, settings, current_objective, state.get('step_3'), save_step_3_progress,
+                                   cache, scheduler)
+        time_used['step_3'] = time.time() - start_time
+        save_checkpoint(checkpoint, state, 'step_3', problem, current_objective)
+    # Local search - Adding and swapping links
+    # --------------------------------------------------------------------------------------
+    if 'local_search' in settings.keys() and settings['local_search']['enabled'] \
+            and not stage_completed(state, 'local_search'):
+        start_time = time.time()
+        scheduler.start_stage('local_search')
+        current_objective = local_search(problem, original_problem.links, settings, current_objective, cache,
+                                         scheduler)
+        time_used['local_search'] = time.time() - start_time
+        save_checkpoint(checkpoint, state, 'local_search', problem, current_objective)
+    # Step 4 - Converting to integer solution
+    # --------------------------------------------------------------------------------------
+    if not stage_completed(state, 'step_4'):
+        start_time = time.time()
+        scheduler.start_stage('step_4')
+        step_4(problem, settings, cache, scheduler)
+        if not problem.random:
+            time_used['step_4'] = time.time() - start_time
+        save_checkpoint(checkpoint, state, 'step_4', problem, current_objective)
+    # Load the feasible solution into our problem object
+    original_problem.read_solution(problem.instance_name)
+    # The heuristic is complete, so there is nothing left to resume
+    checkpoint.clear()
+    # Log used time
+    print('Time overview:')
+    print('-' * 70)
+    for stage, t in time_used.items():
+        print('Time for', HEURISTIC_STAGE_NAMES[stage].lower(), '| Time spent:', str(round(t, 2)) + 's')
+    print('-' * 70)
+    print('Total time      |', str(round(sum(time_used.values()), 2)) + 's')
+    print('-' * 70)
+    return original_problem
+
+
+# Step 1 - Create or load initial solution.
+def step_1(problem, settings, create_initial_solution=True, cache=None, scheduler=None):
+    if scheduler is None:
+        scheduler = Scheduler()
     print()
     # Generate new scenario's for Step 1
     if problem.random:
@@ -33,92 +277,273 @@ def heuristic(problem, settings, create_initial_solution=True):
     if create_initial_solution:
         print('Step 1 | Creating initial solution')
         print('-' * 70)
-        # Create relaxed version of the model and solve it
-        relaxed_model = Model(problem, {
-            'all_links_open': True,
-            'non_integer_trucks': True,
-            'linear_backlog_approx': False,
-            'perfect_delivery': False
-        }, surpress_logs=settings['step_1']['surpress_gurobi'])
-        relaxed_model.write(problem.instance_name + '_relaxed')
-        relaxed_model.solve(problem.instance_name + '_relaxed', {
-            'gap': settings['step_1']['epsilon'],
-            'time': settings['step_1']['time']
-        })
+        if settings['step_1'].get('method', 'relaxed') == 'construction':
+            # The constructed solution is the starting point of Step 2, unless it leaves demand undelivered
+            objective = construct_solution(problem, problem.instance_name + '_relaxed')
+            print('Constructed initial solution with objective', round(objective, 2))
+            if any(report['violations'] > 0 for report in problem.verify_constraints(verbose=False).values()):
+                repair_solution(problem, settings, problem.instance_name + '_relaxed', cache, scheduler)
+        else:
+            solve_relaxed(problem, settings, problem.instance_name + '_relaxed', cache, scheduler)
     else:
         print('Step 1 | Loading initial solution')
         print('-' * 70)
     # Load the solution into our problem object
     problem.read_solution(problem.instance_name + '_relaxed')
-    problem.display()
-    end_time = time.time()
-    time_used.append(end_time - start_time)
-    # Step 2 - Mass link dropping (all low capacity links are removed if improvement found)
-    # --------------------------------------------------------------------------------------
-    start_time = time.time()
-    current_objective = problem.compute_objective()
-    original_problem = copy.deepcopy(problem)
+    problem.display(name=problem.instance_name + '_step_1')
+
+
+# Create the relaxed version of the model (all links open, continuous trucks) and solve it. Capacities can be given
+# (see aggregation_report), they are then fixed in the model, or used as lower bounds if they turn out too tight.
+def solve_relaxed(problem, settings, instance_name, cache=None, scheduler=None, capacities=None):
+    if scheduler is None:
+        scheduler = Scheduler()
+    model_settings = relaxed_model_settings()
+    stopping_criteria = {
+        'gap': settings['step_1']['epsilon'],
+        'time': settings['step_1']['time']
+    }
+    bounds = None
+    if capacities is not None:
+        bounds = {'v': {link: {'lb': capacities[link], 'ub': capacities[link]} for link in problem.links}}
+        objective, _ = solve_model(problem, model_settings, bounds, stopping_criteria=stopping_criteria,
+                                   instance_name=instance_name, surpress_logs=settings['step_1']['surpress_gurobi'],
+                                   time_limit=scheduler.time_limit(), cache=cache,
+                                   profile=settings['step_1'].get('profile'))
+        if objective < np.inf:
+            return
+        bounds = {'v': {link: {'lb': bound['lb']} for link, bound in bounds['v'].items()}}
+    solve_model(problem, model_settings, bounds, stopping_criteria=stopping_criteria, instance_name=instance_name,
+                surpress_logs=settings['step_1']['surpress_gurobi'], write_model=True,
+                time_limit=scheduler.time_limit(), cache=cache, profile=settings['step_1'].get('profile'))
+
+
+# Settings of the relaxed model of Step 1
+def relaxed_model_settings():
+    return {
+        'all_links_open': True,
+        'non_integer_trucks': True,
+        'compact_trucks': True,
+        'linear_backlog_approx': False,
+        'perfect_delivery': False
+    }
+
+
+# Repairs a constructed solution that leaves demand undelivered with the LP relaxation of the relaxed model (linear
+# backlog costs). The constructed capacities are lower bounds, so capacity is only added where demand is missing.
+def repair_solution(problem, settings, instance_name, cache=None, scheduler=None):
+    if scheduler is None:
+        scheduler = Scheduler()
+    model_settings = {
+        'all_links_open': True,
+        'non_integer_trucks': True,
+        'compact_trucks': True,
+        'linear_backlog_approx': True,
+        'lp_relaxation': True
+    }
+    bounds = {'v': {link: {'lb': problem.solution['v'][link]} for link in problem.links}}
+    objective, _ = solve_model(problem, model_settings, bounds, stopping_criteria={'time': settings['step_1']['time']},
+                               instance_name=instance_name, surpress_logs=settings['step_1']['surpress_gurobi'],
+                               time_limit=scheduler.time_limit(), cache=cache,
+                               profile=settings['step_1'].get('profile'))
+    if objective < np.inf:
+        print('Repaired constructed solution with objective', round(objective, 2))
+    else:
+        print('Could not repair the constructed solution, it is used as it is')
+    return objective
+
+
+# Compares the relaxed model of Step 1 on aggregated time periods with the exact one, in terms of solve time and the
+# objective of the initial solution. The capacities of the aggregated model, raised by some headroom, are evaluated
+# in the relaxed model over all periods. That model is still solved, so aggregation does not speed up Step 1 and is
+# not offered as an option of the heuristic: this report shows how the starting designs differ on an instance.
+def aggregation_report(problem, settings, time_buckets=(2, 4), headroom=1.1):
+    if problem.random:
+        problem.generate_scenarios(settings['heuristic_scenarios'])
+    results = {}
+    for time_bucket in [1] + list(time_buckets):
+        instance_name = problem.instance_name + '_relaxed_B' + str(time_bucket)
+        start_time = time.time()
+        capacities = None
+        if time_bucket > 1:
+            aggregated_problem = problem.aggregate_time(time_bucket)
+            if problem.random:
+                aggregated_problem.generate_scenarios(len(problem.scenarios))
+            objective, solution = solve_model(aggregated_problem, relaxed_model_settings(),
+                                              stopping_criteria={'gap': settings['step_1']['epsilon'],
+                                                                 'time': settings['step_1']['time']},
+                                              surpress_logs=settings['step_1']['surpress_gurobi'],
+                                              profile=settings['step_1'].get('profile'))
+            if objective < np.inf:
+                capacities = {link: headroom * solution['v'][link] for link in problem.links}
+        solve_relaxed(problem, settings, instance_name, capacities=capacities)
+        elapsed = time.time() - start_time
+        problem.read_solution(instance_name)
+        results[time_bucket] = (elapsed, problem.compute_objective())
+    exact_time, exact_objective = results[1]
+    print()
+    print('Time aggregation | Step 1 initial solution')
+    print('-' * 70)
+    print('Bucket | Time | Objective | Gap to exact | Time ratio (exact / aggregated)')
+    for time_bucket, (elapsed, objective) in results.items():
+        print(time_bucket, '|', round(elapsed, 2), '|', round(objective, 2), '|',
+              str(round(100 * (objective - exact_objective) / exact_objective, 2)) + '%', '|',
+              str(round(exact_time / elapsed, 2)) + 'x')
+    print('-' * 70)
+    return results
+
+
+# Step 2 - Mass link dropping (all low capacity links are removed if improvement found)
+def step_2(problem, settings, current_objective, progress=None, save_progress=None, cache=None, scheduler=None):
+    if scheduler is None:
+        scheduler = Scheduler()
     # Try mass link dropping
     print()
     print('Step 2 | Mass link dropping (current objective', str(round(current_objective, 2)) + ')')
     print('-' * 70)
+    if settings['step_2'].get('search', 'linear') == 'bisection':
+        problem, current_objective = bisection_step_2(problem, settings, current_objective, cache, scheduler)
+        problem.display(name=problem.instance_name + '_step_2')
+        return problem, current_objective
     start_capacity = settings['step_2']['start_capacity']
     capacity_step = settings['step_2']['capacity_step']
-    current_capacity = start_capacity
+    current_capacity = start_capacity if progress is None else progress['current_capacity']
     while current_capacity >= 0:
+        if scheduler.stage_expired():
+            print('Time budget of Step 2 exhausted')
+            break
         step = round((start_capacity - current_capacity) / capacity_step)
-        # Create alternative problem in which all low-capacity links are dropped
-        alternative_problem = copy.deepcopy(problem)
-        drop_links(alternative_problem, current_capacity)
-        # Fix the capacity of all remaining links equal to their current value
-        v_bounds = get_v_bounds(alternative_problem, method='exact')
-        # Construct and solve the alternative model
-        alternative_model = Model(alternative_problem, {
-            'non_integer_trucks': True,
-            'linear_backlog_approx': not problem.random
-        }, {'v': v_bounds}, surpress_logs=True, parameters=settings['model_parameters'])
-        alternative_objective = alternative_model.solve(problem.instance_name + '_alternative', {
-            'bound': current_objective
-        })
+        alternative_problem, alternative_objective, alternative_solution = drop_links_candidate(
+            problem, settings, current_capacity, current_objective, cache, scheduler)
         # If the solution to the alternative model is an improvement, use it as new starting point (skip to Step 3)
         if alternative_objective < current_objective:
             print('(' + str(step + 1) + '/' + str(round(start_capacity / capacity_step) + 1) + ')',
-                  '| Found improvement by dropping all links with capacity <', current_capacity)
+                  '| Found improvement by dropping all links with capacity <=', current_capacity)
             current_objective = alternative_objective
             problem = alternative_problem
-            problem.read_solution(problem.instance_name + '_alternative')
+            problem.load_solution(alternative_solution, alternative_objective)
             print('New objective |', round(current_objective, 2))
             break
         else:
             print('(' + str(step + 1) + '/' + str(round(start_capacity / capacity_step) + 1) + ')',
-                  '| Rejected dropping all links with capacity <', current_capacity)
+                  '| Rejected dropping all links with capacity <=', current_capacity)
             current_capacity -= capacity_step
-    end_time = time.time()
-    time_used.append(end_time - start_time)
-    problem.display()
-    # Step 3 - Dropping individual links
-    # --------------------------------------------------------------------------------------
-    start_time = time.time()
+            if save_progress is not None:
+                save_progress(current_capacity)
+    problem.display(name=problem.instance_name + '_step_2')
+    return problem, current_objective
+
+
+# Candidate of Step 2 in which all links with a capacity of at most the given capacity are dropped, while the capacity
+# of all remaining links is fixed at its current value
+def drop_links_candidate(problem, settings, capacity, current_objective, cache=None, scheduler=None):
+    if scheduler is None:
+        scheduler = Scheduler()
+    alternative_problem = copy.deepcopy(problem)
+    drop_links(alternative_problem, capacity)
+    v_bounds = get_v_bounds(alternative_problem, method='exact')
+    alternative_objective, alternative_solution = solve_model(alternative_problem, {
+        'non_integer_trucks': True,
+        'compact_trucks': True,
+        'linear_backlog_approx': not problem.random
+    }, {'v': v_bounds}, settings['model_parameters'], {'bound': current_objective},
+        time_limit=scheduler.time_limit(), cache=cache, profile=settings['step_2'].get('profile'))
+    return alternative_problem, alternative_objective, alternative_solution
+
+
+# Step 2 by bisection: only the distinct capacities in the current solution (up to the start capacity) and zero are
+# meaningful thresholds, since any threshold in between drops the same links. Assuming that dropping fewer links
+# improves whenever dropping more links does, the largest improving threshold is found in a logarithmic number of
+# solves. The search is not resumable, an interrupted search is started over.
+def bisection_step_2(problem, settings, current_objective, cache=None, scheduler=None):
+    capacities = sorted([0] + [problem.solution['v'][link] for link in problem.links
+                               if problem.solution['v'][link] <= settings['step_2']['start_capacity']])
+    # Capacities that differ by no more than the feasibility tolerance of the solvers (e.g. LP noise around zero) are
+    # merged into one threshold, the largest of them, so that it drops all of them
+    thresholds, cluster_start = [], None
+    for capacity in capacities:
+        if cluster_start is not None and capacity - cluster_start <= 1e-6:
+            thresholds[-1] = capacity
+        else:
+            thresholds.append(capacity)
+            cluster_start = capacity
+    # thresholds[lower] is the largest threshold known to improve (none yet if -1), thresholds[upper] the smallest
+    # threshold known not to improve
+    lower, upper = -1, len(thresholds)
+    best = None
+    solves = 0
+    while upper - lower > 1:
+        if scheduler is not None and scheduler.stage_expired():
+            print('Time budget of Step 2 exhausted')
+            break
+        middle = (lower + upper) // 2
+        candidate = drop_links_candidate(problem, settings, thresholds[middle], current_objective, cache, scheduler)
+        solves += 1
+        if candidate[1] < current_objective:
+            print('(' + str(solves) + ') | Found improvement by dropping all links with capacity <=',
+                  round(thresholds[middle], 6), '(' + str(round(candidate[1], 2)) + ')')
+            lower, best = middle, candidate
+        else:
+            print('(' + str(solves) + ') | Rejected dropping all links with capacity <=', round(thresholds[middle], 6))
+            upper = middle
+    if best is not None:
+        problem, current_objective, solution = best
+        problem.load_solution(solution, current_objective)
+        print('New objective |', round(current_objective, 2))
+    return problem, current_objective
+
+
+# Step 3 - Dropping individual links
+def step_3(problem, settings, current_objective, progress=None, save_progress=None, cache=None, scheduler=None):
+    if scheduler is None:
+        scheduler = Scheduler()
+    if progress is None:
+        progress = {'iteration': 0, 'rejected_links': set(), 'evaluated': None}
     found_improvement = True
-    iteration = 0
+    iteration = progress['iteration']
     print()
     print('Step 3 | Dropping individual links (current objective', str(round(current_objective, 2)) + ')')
     print('-' * 70)
-    rejected_links = set()
+    rejected_links = progress['rejected_links']
     while found_improvement:
-        iteration += 1
         found_improvement = False
+        # Candidates evaluated before an interruption of this iteration are restored instead of solved again
+        if progress['evaluated'] is not None:
+            restored_objectives = progress['evaluated']
+            restored_best_link = progress['best_dropped_link']
+            restored_best_solution = progress['best_solution']
+        else:
+            iteration += 1
+            restored_objectives, restored_best_link, restored_best_solution = {}, None, None
+        progress = {'iteration': iteration, 'rejected_links': rejected_links, 'evaluated': {},
+                    'best_dropped_link': None, 'best_solution': None}
         print('Iteration', iteration, '|')
         # Initialize best link/problem for this iteration
         best_dropped_link = None
         start_objective = current_objective
         alternative_problem = copy.deepcopy(problem)
         sorted_links = get_utilization_costs(alternative_problem)
+        lower_bounds = {}
+        if settings['step_3'].get('lower_bound_pruning', False):
+            # Order candidates by their expected gain and skip those that provably cannot improve the objective
+            lower_bounds, expected_gains = get_drop_bounds(alternative_problem, settings)
+            sorted_links = sorted(sorted_links, key=lambda link: -expected_gains.get(link, 0))
         for (link_index, dropped_link) in enumerate(sorted_links):
+            if scheduler.stage_expired():
+                # Keep the best improvement found so far, but do not start another iteration
+                print('Time budget of Step 3 exhausted')
+                found_improvement = False
+                break
             rejection_reason = ''
             if dropped_link in rejected_links:
                 rejection_reason = '(Does not need to be reevaluated)'
                 alternative_objective = math.inf
+            elif dropped_link in lower_bounds and lower_bounds[dropped_link] >= start_objective:
+                rejection_reason = '(Lower bound ' + str(round(lower_bounds[dropped_link], 2)) + ' is no improvement)'
+                alternative_objective = math.inf
+            elif dropped_link in restored_objectives:
+                rejection_reason = '(Restored from checkpoint)'
+                alternative_objective = restored_objectives[dropped_link]
             else:
                 # Construct a v_bounds object that will limit our allowed choices of capacity
                 v_bounds = get_v_bounds(alternative_problem, method='exact')
@@ -134,13 +559,13 @@ def heuristic(problem, settings, create_initial_solution=True):
                     for alternative_link in alternative_destination_links:
                         v_bounds[alternative_link].pop('ub')
                     # Construct alternative model using the previously constructed v_bounds and solve it
-                    alternative_model = Model(alternative_problem, {
+                    alternative_objective, alternative_solution = solve_model(alternative_problem, {
                         'non_integer_trucks': True,
+                        'compact_trucks': True,
                         'linear_backlog_approx': not problem.random
-                    }, {'v': v_bounds}, surpress_logs=True, parameters=settings['model_parameters'])
-                    alternative_objective = alternative_model.solve(problem.instance_name + '_alternative', {
-                        'bound': start_objective
-                    })
+                    }, {'v': v_bounds}, settings['model_parameters'], {'bound': start_objective},
+                        time_limit=scheduler.time_limit(), cache=cache, profile=settings['step_3'].get('profile'))
+            progress['evaluated'][dropped_link] = alternative_objective
             # Check if the alternative capacity procurement leads to an objective improvement
             if alternative_objective < start_objective:
                 # Dropping this link is an improvement compared to last iteration
@@ -149,7 +574,12 @@ def heuristic(problem, settings, create_initial_solution=True):
                     # Dropping this link is the best improvement so far
                     current_objective = alternative_objective
                     best_dropped_link = dropped_link
-                    problem.read_solution(problem.instance_name + '_alternative')
+                    if dropped_link == restored_best_link:
+                        problem.solution = restored_best_solution
+                    elif dropped_link not in restored_objectives:
+                        problem.load_solution(alternative_solution, alternative_objective)
+                    progress['best_dropped_link'] = best_dropped_link
+                    progress['best_solution'] = problem.solution
                     # If we are going to check the full list, simply note that this is the best so far
                     if settings['step_3']['check_full_list']:
                         print('(' + str(link_index + 1) + '/' + str(len(sorted_links)) + ')',
@@ -170,6 +600,9 @@ def heuristic(problem, settings, create_initial_solution=True):
                       '| Rejected dropping link', dropped_link, rejection_reason)
                 # Store the rejected link
                 rejected_links.add(dropped_link)
+            # Persist the progress of this iteration so an interruption costs at most one candidate evaluation
+            if save_progress is not None:
+                save_progress(alternative_problem, start_objective, progress)
         if best_dropped_link is not None:
             print('Dropped link |', best_dropped_link)
             print('New objective |', round(current_objective, 2))
@@ -181,13 +614,169 @@ def heuristic(problem, settings, create_initial_solution=True):
             connected_links = connected_links.union(get_connected_links(problem, best_dropped_link[0])[1])
             connected_links = connected_links.union(get_connected_links(problem, best_dropped_link[1])[1])
             rejected_links = rejected_links - connected_links
-    end_time = time.time()
-    time_used.append(end_time - start_time)
-    problem.display()
-    # Step 4 - Converting to integer solution
-    # --------------------------------------------------------------------------------------
+        # The iteration is finished, so its accepted drop becomes the new starting point
+        progress = {'iteration': iteration, 'rejected_links': rejected_links, 'evaluated': None}
+        if save_progress is not None:
+            save_progress(problem, current_objective, progress)
+    problem.display(name=problem.instance_name + '_step_3')
+    return current_objective
+
+
+# Local search - Adding and swapping links. Moves are evaluated in parallel, each warm-started from the current
+# solution, until no move improves the objective or the time budget of this stage runs out.
+def local_search(problem, all_links, settings, current_objective, cache=None, scheduler=None):
+    if scheduler is None:
+        scheduler = Scheduler()
+    print()
+    print('Local search | Adding and swapping links (current objective', str(round(current_objective, 2)) + ')')
+    print('-' * 70)
+    workers = settings['local_search']['workers']
+    deadline = time.time() + min(settings['local_search']['time'], scheduler.stage_remaining())
+    found_improvement = True
+    iteration = 0
+    while found_improvement and time.time() < deadline:
+        iteration += 1
+        found_improvement = False
+        moves = get_local_search_moves(problem, all_links)[:settings['local_search']['max_moves']]
+        print('Iteration', iteration, '|', len(moves), 'moves')
+        best_move, best_solution = None, None
+        start_objective = current_objective
+        # The problem only changes between iterations, so it is passed to the workers once per iteration through the
+        # initializer of a new pool, instead of with every move
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(problem, settings, cache, Model.solver)) as executor:
+            for batch_start in range(0, len(moves), workers):
+                remaining_time = deadline - time.time()
+                if remaining_time <= 0:
+                    print('Time budget of local search exhausted')
+                    break
+                batch = moves[batch_start:batch_start + workers]
+                time_limit = min(settings['local_search']['move_time'], remaining_time)
+                futures = [executor.submit(evaluate_worker_move, move, {'bound': start_objective}, time_limit,
+                                           workers > 1) for move in batch]
+                for move_index, (move, future) in enumerate(zip(batch, futures)):
+                    alternative_objective, alternative_solution = future.result()
+                    description = ('(' + str(batch_start + move_index + 1) + '/' + str(len(moves)) + ') | '
+                                   + ('Add link ' + str(move[1]) if move[0] is None
+                                      else 'Swap link ' + str(move[0]) + ' for ' + str(move[1])))
+                    if alternative_objective < current_objective:
+                        current_objective = alternative_objective
+                        best_move, best_solution = move, alternative_solution
+                        print(description, '| Found improvement', round(alternative_objective, 2))
+                    else:
+                        print(description, '| Rejected')
+                # Moves are accepted greedily after each batch that contains an improvement
+                if best_move is not None:
+                    break
+        if best_move is not None:
+            found_improvement = True
+            dropped_link, added_link = best_move
+            if added_link not in problem.links:
+                add_link(problem, added_link)
+            problem.load_solution(best_solution, current_objective)
+            if dropped_link is not None:
+                drop_link(problem, dropped_link)
+            print('Applied move |', best_move)
+            print('New objective |', round(current_objective, 2))
+            print('-' * 70)
+    problem.display(name=problem.instance_name + '_local_search')
+    return current_objective
+
+
+# Returns all add-link moves (None, link) and swap moves (closed link, opened link) into the same destination,
+# ordered by the change in fixed link costs they cause at the current capacity of the closed link
+def get_local_search_moves(problem, all_links):
+    open_links = [link for link in problem.links if problem.solution['v'][link] > 0]
+    closed_links = [link for link in all_links if link not in open_links]
+    moves = {}
+    for link in closed_links:
+        moves[None, link] = problem.opening_cost[link] + problem.capacity_cost[link]
+        for open_link in open_links:
+            if open_link[1] == link[1]:
+                v = problem.solution['v'][open_link]
+                moves[open_link, link] = problem.opening_cost[link] + problem.capacity_cost[link] * v \
+                    - problem.opening_cost[open_link] - problem.capacity_cost[open_link] * v
+    return [move for move, _ in sorted(moves.items(), key=lambda item: item[1])]
+
+
+# State of a worker process (local search or gap estimation), set once per pool by its initializer
+worker_state = {}
+
+
+def init_worker(problem, settings, cache, solver):
+    # Spawned worker processes do not run main.py, so the solver is configured here as well
+    Model.configure(solver)
+    worker_state['problem'] = problem
+    worker_state['settings'] = settings
+    worker_state['cache'] = cache
+
+
+def evaluate_worker_move(move, stopping_criteria, time_limit=None, single_thread=False):
+    return evaluate_move(worker_state['problem'], move, worker_state['settings'], stopping_criteria, time_limit,
+                         worker_state['cache'], single_thread)
+
+
+# Evaluates a single local search move; executed in a worker process
+def evaluate_move(problem, move, settings, stopping_criteria, time_limit=None, cache=None, single_thread=False):
+    dropped_link, added_link = move
+    # Worker processes start their own environment pool
+    EnvironmentPool.configure(settings.get('environment'))
+    alternative_problem = copy.deepcopy(problem)
+    if added_link not in alternative_problem.links:
+        add_link(alternative_problem, added_link)
+    v_bounds = get_v_bounds(problem, method='exact')
+    v_bounds[added_link] = {'lb': 0}
+    if dropped_link is not None:
+        v_bounds[dropped_link] = {'lb': 0, 'ub': 0}
+    return solve_model(alternative_problem, {
+        'non_integer_trucks': True,
+        'compact_trucks': True,
+        'linear_backlog_approx': not problem.random
+    }, {'v': v_bounds}, settings['model_parameters'], stopping_criteria, start=problem.solution,
+        threads=1 if single_thread else None, time_limit=time_limit, cache=cache,
+        profile=settings['local_search'].get('profile'))
+
+
+# Step 4 - Converting to integer solution
+def step_4(problem, settings, cache=None, scheduler=None):
+    if scheduler is None:
+        scheduler = Scheduler()
+    objective = np.inf
+    rolling_horizon = settings.get('rolling_horizon', {'enabled': False})
+    if rolling_horizon['enabled']:
+        print()
+        print('Step 4 | Converting to integer solution over a rolling horizon of', rolling_horizon['window'],
+              'periods')
+        print('-' * 70)
+        # Capacities are decided once by rounding them up, the operational decisions follow window by window
+        objective, _ = solve_rolling_horizon(problem, {
+            'linear_backlog_approx': True
+        }, {'v': get_v_bounds(problem, method='integer_round_up')}, settings['model_parameters'], {
+            'gap': settings['step_4']['epsilon'],
+            'time': settings['step_4']['time']
+        }, problem.instance_name, rolling_horizon['window'], rolling_horizon['overlap'],
+            surpress_logs=settings['step_4']['surpress_gurobi'], time_limit=scheduler.time_limit(),
+            profile=settings['step_4'].get('profile'))
+        if objective < np.inf:
+            return
+    if settings['step_4'].get('method', 'integer') == 'relax_and_fix':
+        print()
+        print('Step 4 | Converting to integer solution by relax-and-fix over windows of',
+              settings['step_4'].get('window', 10), 'periods')
+        print('-' * 70)
+        time_limit = scheduler.time_limit()
+        objective, _, gap = relax_and_fix(problem, {
+            'linear_backlog_approx': True
+        }, {'v': get_v_bounds(problem, method='integer')}, settings['model_parameters'], {
+            'gap': settings['step_4']['epsilon'],
+            'time': settings['step_4']['time']
+        }, problem.instance_name, settings['step_4'].get('window', 10),
+            surpress_logs=settings['step_4']['surpress_gurobi'],
+            time_limit=None if time_limit is None else time_limit / 2, profile=settings['step_4'].get('profile'))
+        if objective < np.inf:
+            print('Gap to the bound of the first relaxation |', str(round(100 * gap, 2)) + '%')
+            return
     if not problem.random:
-        start_time = time.time()
         print()
         print('Step 4 | Converting to integer solution, finalizing operational decisions')
         print('-' * 70)
@@ -195,46 +784,128 @@ def heuristic(problem, settings, create_initial_solution=True):
         bounds = {
             'v': get_v_bounds(problem, method='integer')
         }
-        # Create reduced, non-relaxed model
-        reduced_model = Model(problem, {
+        # Create reduced, non-relaxed model. Half of the time is reserved for the fallback below, which
+        # is only needed when this model does not find a feasible solution in its time.
+        time_limit = scheduler.time_limit()
+        objective, _ = solve_model(problem, {
             'linear_backlog_approx': True
-        }, bounds=bounds, surpress_logs=settings['step_4']['surpress_gurobi'], parameters=settings['model_parameters'])
-        reduced_model.solve(problem.instance_name, {
+        }, bounds, settings['model_parameters'], {
             'gap': settings['step_4']['epsilon'],
             'time': settings['step_4']['time']
-        })
-        end_time = time.time()
-        time_used.append(end_time - start_time)
+        }, problem.instance_name, surpress_logs=settings['step_4']['surpress_gurobi'],
+            time_limit=None if time_limit is None else time_limit / 2, cache=cache,
+            profile=settings['step_4'].get('profile'))
+    if objective == np.inf:
+        # Rounding up all capacities always gives a feasible design, so we fall back to it
+        objective, _ = solve_model(problem, bounds={'v': get_v_bounds(problem, method='integer_round_up')},
+                                   stopping_criteria={'time': settings['step_4'].get('time_round_up', 5)},
+                                   instance_name=problem.instance_name, start=problem.solution,
+                                   time_limit=scheduler.time_limit(), cache=cache,
+                                   profile=settings['step_4'].get('profile'))
+    if objective == np.inf:
+        # No solution found in the time left, so the rounded up design is written without the solver
+        print('No integer solution found in time, rounding up the trucks of the relaxed solution')
+        round_up_solution(problem, problem.instance_name)
+
+
+# Offline tuning of the solver parameters on a representative model of one of the heuristic steps. Candidate models
+# are Step 3 candidates (dropping the open link with the lowest capacity from the Step 1 solution), integer models
+# are Step 4 models of the Step 1 solution. The best parameters found are saved as a profile that can be selected in
+# the heuristic settings.
+def tune_profile(problem, settings, model_type='candidate', profile_name=None, time_limit=600):
+    if Model.solver != 'gurobi':
+        print()
+        print('Tuning | Parameter tuning is only available for the gurobi solver (selected:', Model.solver + ')')
+        return
+    if profile_name is None:
+        profile_name = problem.instance_name + '_' + model_type
+    if problem.random:
+        problem.generate_scenarios(settings['heuristic_scenarios'])
+    problem.read_solution(problem.instance_name + '_relaxed')
+    if model_type == 'candidate':
+        open_links = [link for link in problem.links if problem.solution['v'][link] > 0]
+        dropped_link = min(open_links, key=lambda link: problem.solution['v'][link])
+        v_bounds = get_v_bounds(problem, method='exact')
+        v_bounds[dropped_link] = {'lb': 0, 'ub': 0}
+        model = Model(problem, {
+            'non_integer_trucks': True,
+            'compact_trucks': True,
+            'linear_backlog_approx': not problem.random
+        }, {'v': v_bounds}, parameters=settings['model_parameters'])
+    elif model_type == 'integer':
+        model = Model(problem, {
+            'linear_backlog_approx': True
+        }, {'v': get_v_bounds(problem, method='integer')}, parameters=settings['model_parameters'])
     else:
-        model = Model(problem, bounds={'v': get_v_bounds(problem, method='integer_round_up')}, surpress_logs=True)
-        model.solve(problem.instance_name, {'time': 5})
-    # Load the feasible solution into our problem object
-    original_problem.read_solution(problem.instance_name)
-    # Log used time
-    print('Time overview:')
-    print('-' * 70)
-    for i, t in enumerate(time_used):
-        print('Time for step', i + 1, '| Time spent:', str(round(t, 2)) + 's')
+        raise ValueError('Unknown model type: ' + model_type)
+    print()
+    print('Tuning | Tuning solver parameters on a', model_type, 'model')
     print('-' * 70)
-    print('Total time      |', str(round(sum(time_used), 2)) + 's')
+    if model.tune(profile_name, time_limit):
+        print('Saved tuned parameter profile |', profile_name)
+    else:
+        print('No improved parameters found')
     print('-' * 70)
-    return original_problem
+
+
+# Functions that store and restore the state of the heuristic in between (parts of) its steps
+# Hash of everything a checkpoint depends on: the instance, the heuristic settings and, in the random case, the random
+# state from which the scenarios are drawn
+def checkpoint_key(problem, settings):
+    key = hashlib.sha256(problem.fingerprint.encode())
+    key.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    if problem.random:
+        key.update(np.random.get_state()[1].tobytes())
+    return key.hexdigest()
+
+
+def stage_completed(state, stage):
+    if state['stage'] is None:
+        return False
+    return HEURISTIC_STAGES.index(state['stage']) >= HEURISTIC_STAGES.index(stage)
+
+
+def save_checkpoint(checkpoint, state, stage, problem, objective):
+    state['stage'] = stage
+    if stage == 'step_1':
+        state['step_1_solution'] = problem.solution
+    state['links'] = problem.links
+    state['solution'] = problem.solution
+    state['objective'] = objective
+    state['scenarios'] = problem.scenarios if problem.random else None
+    state['random_state'] = np.random.get_state()
+    state.pop(stage, None)
+    checkpoint.save(state)
+
+
+def restore_links(problem, state):
+    drop_links_list = [link for link in problem.links if link not in state['links']]
+    for link in drop_links_list:
+        drop_link(problem, link)
+    problem.solution = state['solution']
 
 
 # Random case
-def performance_analysis(problem, M):
+def performance_analysis(problem, M, rolling_horizon=None):
     drop_links(problem)
     # Generate scenarios for evaluation
     objectives = []
     for m in range(M):
         problem.generate_scenarios(1)
-        model = Model(problem, bounds={'v': get_v_bounds(problem, method='exact')}, surpress_logs=True)
-        model.write(problem.instance_name + '_test')
         if m == 0:
             print()
             print('Evaluation |')
             print('-' * 70)
-        objective = model.solve(stopping_criteria={'gap': 0.01}, instance_name=problem.instance_name + '_evaluation')
+        if rolling_horizon is not None and rolling_horizon['enabled']:
+            objective, _ = solve_rolling_horizon(problem, bounds={'v': get_v_bounds(problem, method='exact')},
+                                                 stopping_criteria={'gap': 0.01},
+                                                 instance_name=problem.instance_name + '_evaluation',
+                                                 window=rolling_horizon['window'], overlap=rolling_horizon['overlap'])
+        else:
+            model = Model(problem, bounds={'v': get_v_bounds(problem, method='exact')}, surpress_logs=True)
+            model.write(problem.instance_name + '_test')
+            objective = model.solve(stopping_criteria={'gap': 0.01},
+                                    instance_name=problem.instance_name + '_evaluation')
         print(f'({m + 1}/{M}) | Found objective: {round(objective, 2)}')
         objectives.append(objective)
         # These lines can be used to log the evaluation scenario objectives
@@ -243,6 +914,114 @@ def performance_analysis(problem, M):
     print('-' * 70)
     np.savetxt('Evaluations/' + problem.instance_name + '_M' + str(M) + '_T' + str(problem.end) + '.txt',
                objectives, fmt="%s")
+    return objectives
+
+
+# Progressive SAA: the heuristic is run on a small number of scenarios, after which the number of scenarios is
+# doubled until the out-of-sample estimate of the design stabilizes. Earlier scenarios are kept, so each larger SAA
+# model is started from the previous design and its recourse decisions for those scenarios. Returns the problem with
+# the final solution.
+def progressive_saa(problem, settings, create_initial_solution=True, resume=False):
+    progressive = settings['progressive_saa']
+    N = progressive['initial_scenarios']
+    # The scenarios of the first sample are those that are generated in Step 1
+    problem = heuristic(problem, dict(settings, heuristic_scenarios=N), create_initial_solution, resume)
+    estimate = np.inf
+    print()
+    print('Progressive SAA |')
+    print('-' * 70)
+    while True:
+        # Evaluation drops links and replaces the scenarios, so it is done on a copy
+        objectives = performance_analysis(copy.deepcopy(problem), progressive['evaluation_scenarios'],
+                                          settings.get('rolling_horizon'))
+        previous_estimate, estimate = estimate, np.average(objectives)
+        print('Scenarios |', N, '| Out-of-sample estimate |', round(estimate, 2))
+        if abs(estimate - previous_estimate) <= progressive['tolerance'] * abs(estimate) \
+                or 2 * N > progressive['max_scenarios']:
+            break
+        N *= 2
+        problem.generate_scenarios(N, keep=True)
+        objective, _ = solve_model(problem, {}, None, settings['model_parameters'], {
+            'gap': settings['step_4']['epsilon'],
+            'time': progressive['time']
+        }, problem.instance_name, surpress_logs=settings['step_4']['surpress_gurobi'], start=problem.solution,
+            profile=settings['step_4'].get('profile'))
+        if objective == np.inf:
+            print('No solution found with', N, 'scenarios, keeping the design of', N // 2, 'scenarios')
+            problem.scenarios = problem.scenarios[:N // 2]
+            break
+        problem.read_solution(problem.instance_name)
+    print('-' * 70)
+    return problem
+
+
+# Lower bound estimates for the optimal objective by multiple replications: R independent SAA models (all links,
+# integer trucks) are solved in parallel, each on its own sample of scenarios. The expected optimal objective of an SAA
+# model is at most the true optimal objective, so the proven bound of every replication is a lower bound estimate.
+def replication_bounds(problem, settings):
+    replications = settings['gap_estimation']['replications']
+    workers = settings['gap_estimation']['workers']
+    N = settings['gap_estimation'].get('scenarios', settings['heuristic_scenarios'])
+    # Every replication gets its own seed, drawn from the current random state
+    seeds = np.random.randint(0, 2 ** 31 - 1, size=replications)
+    print()
+    print('Gap estimation |', replications, 'replications of', N, 'scenarios')
+    print('-' * 70)
+    lower_bounds = []
+    if workers == 1:
+        # Without parallelism the replications are solved in this process, one after the other
+        for r, seed in enumerate(seeds):
+            lower_bounds.append(solve_replication(problem, settings, N, int(seed)))
+            print(f'({r + 1}/{replications}) | Lower bound: {round(lower_bounds[-1], 2)}')
+    else:
+        # The problem is passed to the workers once through the initializer of the pool
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(problem, settings, None, Model.solver)) as executor:
+            futures = [executor.submit(solve_worker_replication, N, int(seed)) for seed in seeds]
+            for r, future in enumerate(futures):
+                lower_bounds.append(future.result())
+                print(f'({r + 1}/{replications}) | Lower bound: {round(lower_bounds[-1], 2)}')
+    print('-' * 70)
+    return lower_bounds
+
+
+def solve_worker_replication(N, seed):
+    return solve_replication(worker_state['problem'], worker_state['settings'], N, seed, single_thread=True)
+
+
+def solve_replication(problem, settings, N, seed, single_thread=False):
+    # Worker processes start their own environment pool
+    EnvironmentPool.configure(settings.get('environment'))
+    problem = copy.deepcopy(problem)
+    # The scenarios are drawn from a generator of their own, so the global random state is left untouched
+    problem.generate_scenarios(N, rng=np.random.RandomState(seed))
+    environment = get_profile(settings['step_4'].get('profile'))
+    if single_thread:
+        environment['Threads'] = 1
+    model = Model(problem, parameters=settings['model_parameters'], surpress_logs=True, environment=environment)
+    model.solve(stopping_criteria={
+        'gap': settings['step_4']['epsilon'],
+        'time': settings['gap_estimation']['time']
+    })
+    return model.get_bound()
+
+
+# Confidence interval for the optimality gap of a design, from the objectives of its evaluation (upper bound estimate)
+# and the bounds of the replications (lower bound estimate)
+def optimality_gap(objectives, lower_bounds):
+    upper_bound, lower_bound = np.average(objectives), np.average(lower_bounds)
+    gap = upper_bound - lower_bound
+    half_width = 1.96 * math.sqrt(np.var(objectives, ddof=1) / len(objectives)
+                                  + np.var(lower_bounds, ddof=1) / len(lower_bounds))
+    print('Optimality gap statistics |')
+    print('-' * 70)
+    print('Upper bound estimate |', round(upper_bound, 2))
+    print('Lower bound estimate |', round(lower_bound, 2))
+    print('Gap estimate         |', round(gap, 2), '(' + str(round(100 * gap / upper_bound, 2)) + '%)')
+    print('CI Lower bound       |', round(max(gap - half_width, 0), 2))
+    print('CI Upper bound       |', round(gap + half_width, 2))
+    print('-' * 70)
+    return gap, max(gap - half_width, 0), gap + half_width
 
 
 def monte_carlo_histogram(problem, M):
@@ -262,24 +1041,20 @@ def monte_carlo_histogram(problem, M):
     print('-' * 70)
 
 
-# Functions that remove one or multiple links from a problem
+# Functions that add or remove one or multiple links from a problem (the index sets built on the links follow along)
 def drop_link(problem, link):
     problem.links.remove(link)
-    for t in problem.T:
-        problem.link_time.remove((link[0], link[1], t))
-        for p in problem.P:
-            problem.link_product_time.remove((link[0], link[1], p, t))
+
+
+def add_link(problem, link):
+    problem.links.append(link)
 
 
 def drop_links(problem, maximum_capacity=0.0):
     unused_links = [link for link in problem.links if problem.solution['v'][link] <= maximum_capacity]
-    # Remove links form all relevant sets
+    # Remove links from the problem
     for link in unused_links:
         problem.links.remove(link)
-        for t in problem.T:
-            problem.link_time.remove((link[0], link[1], t))
-            for p in problem.P:
-                problem.link_product_time.remove((link[0], link[1], p, t))
     return unused_links
 
 
@@ -308,6 +1083,24 @@ def get_v_bounds(problem, method='integer'):
     return v_bounds
 
 
+# Rounds up the trucks and capacities of the current (relaxed) solution, while keeping its flows. The result is a
+# feasible solution with integer trucks, which is written to a solution file. Returns its objective.
+def round_up_solution(problem, instance_name):
+    solution = copy.deepcopy(problem.solution)
+    solution['k'] = {index: math.ceil(value) for index, value in solution['k'].items()}
+    # The capacity of a link covers its trucks in every period
+    trucks = {}
+    for index, value in solution['k'].items():
+        trucks[index[:2]] = max(trucks.get(index[:2], 0), value)
+    for link in problem.links:
+        solution['v'][link] = max(math.ceil(solution['v'][link]), trucks.get(link, 0))
+        solution['l'][link] = 1 if solution['v'][link] > 0 else 0
+    problem.load_solution(solution)
+    objective = problem.compute_objective()
+    write_solution(instance_name, solution, objective)
+    return objective
+
+
 # Returns the sorted utilization costs of all links with a non-zero capacity
 def get_utilization_costs(problem):
     utilization_costs = {}
@@ -334,6 +1127,31 @@ def get_utilization_costs(problem):
     return utilization_costs
 
 
+# Returns a lower bound on the objective after dropping each link with a non-zero capacity, together with the
+# expected gain of dropping it. Both follow from a single LP relaxation in which every link keeps at least its
+# current capacity: lowering the capacity of a link to zero can decrease the LP objective by at most its reduced
+# cost times its capacity, and closing the link additionally saves its opening cost.
+def get_drop_bounds(problem, settings):
+    open_links = [link for link in problem.links if problem.solution['v'][link] > 0]
+    bounds = {
+        'v': get_v_bounds(problem, method='exact_lower_bounds'),
+        'l': {link: {'lb': 1} for link in open_links}
+    }
+    model = Model(problem, {
+        'non_integer_trucks': True,
+        'linear_backlog_approx': not problem.random,
+        'lp_relaxation': True
+    }, bounds, surpress_logs=True, parameters=settings['model_parameters'])
+    objective = model.solve()
+    if objective == np.inf:
+        return {}, {}
+    reduced_costs = model.get_reduced_costs('v')
+    expected_gains = {link: max(reduced_costs[link], 0) * problem.solution['v'][link] + problem.opening_cost[link]
+                      for link in open_links}
+    lower_bounds = {link: objective - expected_gains[link] for link in open_links}
+    return lower_bounds, expected_gains
+
+
 # Recursively returns all links that can be used to reach a destination if some link is dropped
 def get_alternative_links(problem, destination, dropped_link, alternative_links=None):
     if alternative_links is None:
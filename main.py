@@ -1,18 +1,32 @@
 from Problem import Problem, gen_instance
 from Solver import *
+from Display import Display
+from Model import Model
+from Presolve import presolve
 import winsound
 
 # Task to run
 # --------------------------------------------------------------------------------------
 instance_name = 'random_data_set_small'   # Enter a number to generate a random instance
-method = 'heuristic'                     # Options are 'read', 'solve', 'heuristic'
+method = 'heuristic'                     # Options are 'read', 'solve', 'heuristic', 'tune', 'aggregation_report'
 seed = 700                          # Seed is used when generating scenarios
+solver = 'gurobi'                       # Options are 'gurobi', 'highs' (open-source, no license required)
 
 # Task settings (only used if method is 'heuristic')
 # --------------------------------------------------------------------------------------
 create_initial_solution = True          # If False, the initial solution is loaded from an existing file
+resume = False                          # If True, the heuristic continues from its latest checkpoint
 evaluation_scenarios = 100              # Number of scenarios to run in Monte Carlo evaluation
 extra_time_periods = False              # If set to True, the model uses 10% extra time periods
+presolve_network = True                 # If True, dominated and unusable links are removed before solving
+tuning_model_type = 'candidate'         # Model to tune on if method is 'tune'. Options are 'candidate', 'integer'
+tuning_time = 600                       # Time limit for tuning
+display_settings = {
+    'enabled': True,                    # If False, nothing is drawn (e.g. for benchmark runs)
+    'interactive': True,                # If False, figures are rendered without a window (e.g. on headless nodes)
+    'directory': None,                  # If set, every figure is also written to this directory
+    'file_format': 'png'                # Options are 'png', 'svg'
+}
 heuristic_settings = {
     'heuristic_scenarios': 25,          # Number of scenarios to use in the SAA-models in our heuristic
     'model_parameters': {
@@ -20,62 +34,139 @@ heuristic_settings = {
         'delta': 0.25,                  # Delta_B
     },
     'step_1': {
+        'method': 'relaxed',            # 'relaxed' solves the relaxed model, 'construction' builds a solution directly
         'epsilon': 0.001,               # Optimality gap stopping criterion for Step 1
         'time': 99999,
-        'surpress_gurobi': False
+        'surpress_gurobi': False,
+        'profile': 'default'            # Solver parameter profile (see Environment.py, or the name of a tuned profile)
     },
     'step_2': {
+        'search': 'linear',             # 'linear' steps down from the start capacity, 'bisection' bisects on capacities
         'start_capacity': 2.5,          # m
-        'capacity_step': 0.25           # Delta_m
+        'capacity_step': 0.25,          # Delta_m
+        'profile': 'default'
     },
     'step_3': {
-        'check_full_list': False        # If True, the best improvement from the entire list is chosen on each iteration
+        'check_full_list': False,       # If True, the best improvement from the entire list is chosen on each iteration
+        'lower_bound_pruning': False,   # If True, candidates are ordered and pruned using an LP lower bound
+        'profile': 'default'
+    },
+    'local_search': {
+        'enabled': False,               # If True, links are added and swapped after Step 3
+        'workers': 4,                   # Number of moves that are evaluated in parallel
+        'max_moves': 200,               # Maximum number of moves evaluated per iteration (cheapest moves first)
+        'move_time': 60,                # Time limit for the evaluation of a single move
+        'time': 1800,                   # Time budget for the entire local search
+        'profile': 'default'
     },
     'step_4': {
+        'method': 'integer',            # 'integer' solves the integer model at once, 'relax_and_fix' window by window
+        'window': 10,                   # Periods with integer trucks per window in relax-and-fix (10 if left out)
         'epsilon': 0.001,               # Optimality gap stopping criterion for Step 4
         'time': 7200,
-        'surpress_gurobi': False
+        'time_round_up': 5,             # Time limit for rounding up all capacities (random case or as fallback)
+        'surpress_gurobi': False,
+        'profile': 'mip_heuristic'
+    },
+    'rolling_horizon': {
+        'enabled': False,               # If True, Step 4 and the evaluation solve the operations window by window
+        'window': 10,                   # Number of periods per window
+        'overlap': 2                    # Number of periods by which consecutive windows overlap
+    },
+    'gap_estimation': {
+        'enabled': False,               # If True, the optimality gap of the final design is estimated
+        'replications': 10,             # Number of independent SAA models that give the lower bound estimate
+        'scenarios': 25,                # Number of scenarios per replication
+        'workers': 4,                   # Number of replications that are solved in parallel
+        'time': 600                     # Time limit per replication
+    },
+    'progressive_saa': {
+        'enabled': False,               # If True, the number of scenarios is doubled until the estimate stabilizes
+        'initial_scenarios': 5,         # Number of scenarios of the first run of the heuristic
+        'max_scenarios': 80,            # Maximum number of scenarios
+        'tolerance': 0.01,              # Relative change of the out-of-sample estimate at which the search stops
+        'evaluation_scenarios': 20,     # Number of scenarios of the out-of-sample estimate of each design
+        'time': 600                     # Time limit for solving each larger SAA model
+    },
+    'environment': {                    # Gurobi parameters applied to the environment that all models are built on
+        'Method': -1,                   # Options are -1 (automatic), 0 (primal simplex), 1 (dual simplex), 2 (barrier)
+        'Presolve': -1                  # Options are -1 (automatic), 0 (off), 1 (conservative), 2 (aggressive)
+    },
+    'time_budget': {
+        'total': None,                  # Global wall-clock budget for the heuristic in seconds (None for no budget)
+        'shares': {                     # Relative share of the remaining budget that each stage receives
+            'step_1': 0.3,
+            'step_2': 0.1,
+            'step_3': 0.3,
+            'local_search': 0.1,
+            'step_4': 0.2
+        }
+    },
+    'cache': {
+        'enabled': False,               # If True, solved link configurations are reused across (repeated) runs
+        'max_entries': 10000,           # Least recently used entries are removed beyond this number of entries
+        'max_size': 1024                # or beyond this total size (in MB)
     }
 }
 
 # Function calls
 # --------------------------------------------------------------------------------------
-if instance_name not in ['small_data_set', 'large_data_set', 'random_data_set', 'random_data_set_small']:
-    # This function can be called to generate an .xlsx instance file
-    gen_instance(seed=int(instance_name),
-                 num_s=6,
-                 num_d=6,
-                 num_c=12,
-                 num_p=1,
-                 T=20)
-    instance_name = str(instance_name)
+# Worker processes (spawned on Windows) import this file as well, the script only runs in the main process
+if __name__ == '__main__':
+    if instance_name not in ['small_data_set', 'large_data_set', 'random_data_set', 'random_data_set_small']:
+        # This function can be called to generate an .xlsx instance file
+        gen_instance(seed=int(instance_name),
+                     num_s=6,
+                     num_d=6,
+                     num_c=12,
+                     num_p=1,
+                     T=20)
+        instance_name = str(instance_name)
 
-# Check if we are dealing with a random data set
-random = instance_name in ['random_data_set', 'random_data_set_small']
-if not random:
-    seed = None
+    # Check if we are dealing with a random data set
+    random = instance_name in ['random_data_set', 'random_data_set_small']
+    if not random:
+        seed = None
 
-# Read and create problem
-problem = Problem(instance_name, random=random, seed=seed, extra_time_periods=extra_time_periods)
+    # Read and create problem
+    Display.configure(**display_settings)
+    Model.configure(solver)
+    problem = Problem(instance_name, random=random, seed=seed, extra_time_periods=extra_time_periods)
+    # Existing solutions may use links that presolve removes, so they are read into the full problem
+    if presolve_network and method != 'read':
+        presolve(problem)
 
-# Solve it using the heuristic and display the solution
-if method == 'read':
-    problem.read_solution(instance_name)
-elif method == 'solve':
-    problem = solve(problem)
-elif method == 'heuristic':
-    problem = heuristic(problem, heuristic_settings, create_initial_solution)
+    # Solve it using the heuristic and display the solution
+    if method == 'read':
+        problem.read_solution(instance_name)
+    elif method == 'solve':
+        problem = solve(problem)
+    elif method == 'heuristic':
+        if random and heuristic_settings['progressive_saa']['enabled']:
+            problem = progressive_saa(problem, heuristic_settings, create_initial_solution, resume)
+        else:
+            problem = heuristic(problem, heuristic_settings, create_initial_solution, resume)
+    elif method == 'aggregation_report':
+        aggregation_report(problem, heuristic_settings)
+    elif method == 'tune':
+        # Tune on the Step 1 solution of this instance, the tuned profile can then be selected in the heuristic settings
+        tune_profile(problem, heuristic_settings, tuning_model_type, time_limit=tuning_time)
 
-# Log functions for solution
-# --------------------------------------------------------------------------------------
-if not problem.random:
-    problem.log_objective(summary_only=True)
-problem.display(integer=True)
+    # Log functions for solution
+    # --------------------------------------------------------------------------------------
+    if not problem.random:
+        problem.log_objective(summary_only=True)
+    problem.display(integer=True)
 
-# Run Monte Carlo performance analysis
-if random:
-    M = evaluation_scenarios
-    performance_analysis(problem, M)
-    monte_carlo_histogram(problem, M)
+    # Run Monte Carlo performance analysis
+    if random:
+        M = evaluation_scenarios
+        # The replications solve the SAA model over all links, so they are run before the evaluation drops links
+        if heuristic_settings['gap_estimation']['enabled']:
+            lower_bounds = replication_bounds(problem, heuristic_settings)
+        objectives = performance_analysis(problem, M, heuristic_settings['rolling_horizon'])
+        monte_carlo_histogram(problem, M)
+        if heuristic_settings['gap_estimation']['enabled']:
+            optimality_gap(objectives, lower_bounds)
 
-input('Press enter to exit..')
+    input('Press enter to exit..')
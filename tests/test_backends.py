@@ -0,0 +1,76 @@
+import pytest
+
+pytest.importorskip('numpy')
+pytest.importorskip('gurobipy')
+pytest.importorskip('highspy')
+
+from Backend import GurobiBackend, HighsBackend, INTEGER, BINARY
+
+# Small fixed-charge covering problem: items are bought in integer quantities from opened suppliers to cover a demand
+COSTS = [7, 9, 11, 13, 5, 8]
+SIZES = [3, 4, 6, 7, 2, 5]
+OPENING_COSTS = [10, 4, 12, 9, 15, 6]
+DEMAND = 23
+
+
+def build(backend_class):
+    backend = backend_class()
+    indices = range(len(COSTS))
+    x = backend.add_vars(indices, vtype=INTEGER, ub=10, name='x')
+    y = backend.add_vars(indices, vtype=BINARY, name='y')
+    backend.add_constrs((x[i] - 10 * y[i] <= 0 for i in indices), name='open')
+    backend.add_constrs((backend.quicksum(SIZES[i] * x[i] for i in indices) >= DEMAND for _ in [0]), name='demand')
+    backend.set_objective(backend.quicksum(COSTS[i] * x[i] + OPENING_COSTS[i] * y[i] for i in indices))
+    return backend
+
+
+def optimum(backend_class):
+    backend = build(backend_class)
+    return backend.solve()
+
+
+@pytest.mark.parametrize('backend_class', [GurobiBackend, HighsBackend])
+def test_optimal(backend_class):
+    backend = build(backend_class)
+    objective = backend.solve({'gap': 0})
+    assert backend.status == 2
+    assert objective == pytest.approx(optimum(GurobiBackend))
+    assert backend.get_bound() == pytest.approx(objective)
+
+
+# A bound above the optimum is never reached, so both backends solve to optimality
+@pytest.mark.parametrize('backend_class', [GurobiBackend, HighsBackend])
+def test_bound_not_reached(backend_class):
+    objective = optimum(GurobiBackend)
+    backend = build(backend_class)
+    assert backend.solve({'bound': objective + 1}) == pytest.approx(objective)
+    assert backend.status == 2
+
+
+# A bound below the optimum is reached: both backends stop (or already finished) with a bound of at least the given
+# bound, and a solution that is not better than the optimum
+@pytest.mark.parametrize('backend_class', [GurobiBackend, HighsBackend])
+def test_bound_reached(backend_class):
+    objective = optimum(GurobiBackend)
+    backend = build(backend_class)
+    result = backend.solve({'bound': objective - 1})
+    assert backend.status in [2, 15]
+    assert result >= objective - 1e-6
+    assert objective - 1 - 1e-6 <= backend.get_bound() <= objective + 1e-6
+
+
+# The objective criterion stops as soon as a solution at least as good as the given objective is found
+@pytest.mark.parametrize('backend_class', [GurobiBackend, HighsBackend])
+def test_objective(backend_class):
+    objective = optimum(GurobiBackend)
+    backend = build(backend_class)
+    result = backend.solve({'objective': objective + 10})
+    assert backend.status in [2, 15]
+    assert objective - 1e-6 <= result <= objective + 10 + 1e-6
+
+
+@pytest.mark.parametrize('criterion', [{}, {'gap': 0}, {'time': 60}])
+def test_backends_agree(criterion):
+    gurobi, highs = build(GurobiBackend), build(HighsBackend)
+    assert gurobi.solve(dict(criterion)) == pytest.approx(highs.solve(dict(criterion)))
+    assert gurobi.status == highs.status